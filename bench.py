@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import platform
+import argparse
+import itertools
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from main import GroundTruth, feed_estimators, calculate_metrics
+from memory import peak_rss_bytes
+from lossy import LossyCounting
+from misragries import MisraGries
+from spacesaving import SpaceSaving
+from cms import CountMinSketch
+from parsing import iter_query_bytes
+from synthetic import ZipfStream
+
+# Estimators the harness can sweep. Counter-based ones are sized by epsilon (k = 1/eps),
+# the Count-Min variants by width and depth.
+COUNTER_KINDS = {
+    "mg": lambda eps: MisraGries(int(1 / eps)),
+    "lc": lambda eps: LossyCounting(eps),
+    "ss": lambda eps: SpaceSaving(int(1 / eps)),
+}
+CMS_KINDS = {
+    "cms": "standard",
+    "cmscu": "conservative",
+    "cmscmm": "count-mean-min",
+}
+KINDS = ("gt", *COUNTER_KINDS, *CMS_KINDS)
+
+def build(config: dict):
+    kind = config["estimator"]
+    if kind == "gt":
+        return GroundTruth()
+    if kind in COUNTER_KINDS:
+        return COUNTER_KINDS[kind](config["eps"])
+    return CountMinSketch(width=config["width"], depth=config["depth"], policy=CMS_KINDS[kind])
+
+def sweep(estimators, limits, eps_values, widths, depths, skews=(None,)):
+    """
+    Every configuration of the grid, as dicts; parameters that don't apply to an estimator are None.
+    A skew other than None replaces the log with a synthetic Zipf stream of that skew.
+    """
+    configs = []
+    for skew, limit in itertools.product(skews, limits):
+        for kind in estimators:
+            if kind in COUNTER_KINDS:
+                grid = [{"eps": eps} for eps in eps_values]
+            elif kind in CMS_KINDS:
+                grid = [{"width": w, "depth": d} for w, d in itertools.product(widths, depths)]
+            else:
+                grid = [{}]
+            for params in grid:
+                configs.append({"estimator": kind, "limit": limit, "skew": skew, "eps": None,
+                                "width": None, "depth": None, **params})
+    return configs
+
+def _peak_rss_mb() -> float:
+    return peak_rss_bytes() / (1024 * 1024)
+
+def _heavy_error(estimator, gt, total):
+    """(avg abs error, avg rel error) over the heavy hitters, as in main.py."""
+    if isinstance(estimator, Counter):
+        return 0.0, 0.0
+    ae, re, _ = calculate_metrics(gt, estimator, total)
+    return ae, re
+
+def _batches(filename, config, batch_size, vocab, seed):
+    """A fresh pass over the configuration's stream: the log through the memory map, or a new seeded ZipfStream."""
+    if config["skew"] is not None:
+        return ZipfStream(config["limit"], vocab, config["skew"], seed, batch_size)
+    return iter_query_bytes(filename, config["limit"], batch_size)
+
+def run_config(filename, config, warmup, repeats, batch_size=10000, vocab=100000, seed=0):
+    """
+    One configuration: warmup runs, then timed runs, each on a fresh estimator over a fresh
+    pass of the same stream. Only update time is measured, and no run holds the stream in
+    memory. Runs in its own process, which makes the peak RSS belong to this configuration alone.
+    """
+    rss_before = _peak_rss_mb()
+
+    times = []
+    for run in range(warmup + repeats):
+        estimator = build(config)
+        batches = _batches(filename, config, batch_size, vocab, seed)
+        total, timings, _ = feed_estimators(batches, {"e": estimator})
+        if run >= warmup:
+            times.append(timings["e"])
+    if isinstance(estimator, Counter):
+        gt = estimator
+    elif config["skew"] is not None:
+        # The generator counts every rank as it draws, so the exact counts need no extra pass
+        gt = batches.ground_truth()
+    else:
+        gt = GroundTruth()
+        feed_estimators(_batches(filename, config, batch_size, vocab, seed), {"gt": gt})
+    ae, re = _heavy_error(estimator, gt, total)
+    median = float(np.median(times))
+    return {
+        **config,
+        "queries": total,
+        "runs": repeats,
+        "median_s": median,
+        "p95_s": float(np.percentile(times, 95)),
+        "min_s": min(times),
+        "items_per_s": total / median if median else None,
+        "memory_kb": estimator.nbytes() / 1024,
+        "peak_rss_mb": _peak_rss_mb(),
+        "rss_growth_mb": _peak_rss_mb() - rss_before,
+        "avg_abs_error": ae,
+        "avg_rel_error": re,
+    }
+
+def run_benchmarks(filename, configs, warmup=1, repeats=5, progress=print, vocab=100000, seed=0):
+    """Runs every configuration in a fresh process (one at a time) and returns the result rows."""
+    rows = []
+    for config in configs:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            row = pool.submit(run_config, filename, config, warmup, repeats, vocab=vocab, seed=seed).result()
+        rows.append(row)
+        if progress:
+            progress(format_row(row))
+    return rows
+
+def _params(row) -> str:
+    params = "-"
+    if row["eps"] is not None:
+        params = f"eps={row['eps']:g}"
+    elif row["width"] is not None:
+        params = f"{row['width']}x{row['depth']}"
+    return params if row["skew"] is None else f"{params} s={row['skew']:g}"
+
+def format_row(row) -> str:
+    return (f"{row['estimator']:<7} | {_params(row):<18} | {row['queries']:<11,} | {row['median_s']:<10.4f} | "
+            f"{row['p95_s']:<10.4f} | {row['items_per_s'] or 0:<13,.0f} | {row['memory_kb']:<10.1f} | "
+            f"{row['peak_rss_mb']:<9.1f} | {f'{row['avg_rel_error']*100:.2f}%':<8}")
+
+HEADER = (f"{'EST':<7} | {'PARAMS':<18} | {'QUERIES':<11} | {'MEDIAN (s)':<10} | {'P95 (s)':<10} | "
+          f"{'ITEMS/S':<13} | {'RAM (KB)':<10} | {'PEAK MB':<9} | {'REL ERR':<8}")
+
+def save_results(path, rows, settings):
+    """One JSON file per sweep: the settings, the environment and every result row."""
+    document = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": settings,
+        "results": rows,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+
+def _list(kind):
+    return lambda text: [kind(value) for value in text.split(",") if value]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sweeps over the heavy hitter estimators.")
+    parser.add_argument("filename", nargs="?", default="clean.txt")
+    parser.add_argument("--limits", type=_list(int), default=[100000],
+                        help="Comma separated stream lengths (lines); 0 reads the whole file")
+    parser.add_argument("--estimators", type=_list(str), default=["mg", "lc", "ss", "cms"],
+                        help=f"Comma separated, from {', '.join(KINDS)}")
+    parser.add_argument("--eps", type=_list(float), default=[0.0005], help="Epsilons for mg, lc and ss (k = 1/eps)")
+    parser.add_argument("--widths", type=_list(int), default=[10000], help="Count-Min widths")
+    parser.add_argument("--depths", type=_list(int), default=[5], help="Count-Min depths")
+    parser.add_argument("--zipf", type=_list(float), default=None, metavar="SKEWS",
+                        help="Comma separated Zipf skews: benchmark synthetic streams instead of the log")
+    parser.add_argument("--vocab", type=int, default=100000, help="Distinct queries in the synthetic streams")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic streams")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs before the timed ones")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per configuration")
+    parser.add_argument("--out", default="bench_results.json", help="Results file")
+    args = parser.parse_args()
+
+    unknown = set(args.estimators) - set(KINDS)
+    if unknown:
+        parser.error(f"Unknown estimators: {', '.join(sorted(unknown))}")
+    if args.repeats < 1:
+        parser.error("--repeats must be at least 1")
+    if args.zipf and not all(args.limits):
+        parser.error("--zipf needs a stream length in every --limits value")
+
+    configs = sweep(args.estimators, [limit or None for limit in args.limits], args.eps, args.widths, args.depths,
+                    args.zipf or [None])
+    source = f"Zipf streams over {args.vocab:,} queries" if args.zipf else args.filename
+    print(f"Benchmark: {source}, {len(configs)} configurations, {args.warmup} warmup + {args.repeats} runs each")
+    print(HEADER)
+    print("-" * len(HEADER))
+    rows = run_benchmarks(args.filename, configs, args.warmup, args.repeats, vocab=args.vocab, seed=args.seed)
+    save_results(args.out, rows, vars(args))
+    print(f"\nResults → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import time
+import zlib
+import struct
+
+from sketch_io import pack_header, unpack_header, write_atomic, read_file
+
+CKPT_MAGIC = b"CKP1"
+
+# Bytes before the saved offset that are checked on resume, to catch a different or rewritten file
+FINGERPRINT_BYTES = 4096
+
+_LENGTH = struct.Struct("<I")
+
+
+def _fingerprint(filename: str, offset: int) -> int:
+    with open(filename, "rb") as f:
+        f.seek(max(offset - FINGERPRINT_BYTES, 0))
+        return zlib.crc32(f.read(min(offset, FINGERPRINT_BYTES)))
+
+
+class Checkpoint:
+    """
+    Ingestion progress saved to one file: the byte offset reached in the log, the raw lines
+    and queries read up to there, and every estimator in its to_bytes() form.
+    The file is replaced atomically, so an interrupted run leaves the previous checkpoint intact.
+
+    Checkpoints are saved at block edges, and a run resumed from one reads the same blocks and
+    batches as an uninterrupted run, so it ends with the same estimators. The exception is the
+    final checkpoint of a run stopped by max_lines, which usually falls inside a block: the
+    resumed run then cuts its batches elsewhere, and the conservative-update sketches (whose
+    add_many depends on where batches are cut) can end up a little different, though never
+    below the true counts. All other estimators come out the same either way.
+
+    Layout: header (magic, offset, lines, total, fingerprint, number of estimators), then per
+    estimator its name and payload, each prefixed with a uint32 length.
+    """
+
+    def __init__(self, path: str, every_lines: int = 1_000_000, every_seconds: float = None):
+        self.path = path
+        self.every_lines = every_lines
+        self.every_seconds = every_seconds
+        self.offset = None
+        self.lines = 0
+        self.total = 0
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    def save(self, filename: str, estimators: dict, offset: int, lines: int, total: int):
+        fields = [_fingerprint(filename, offset), len(estimators)]
+        parts = [pack_header("QQQIH", CKPT_MAGIC, offset, lines, total, *fields)]
+        for name, estimator in estimators.items():
+            for blob in (name.encode(), estimator.to_bytes()):
+                parts.append(_LENGTH.pack(len(blob)))
+                parts.append(blob)
+        write_atomic(self.path, b"".join(parts))
+        self.offset, self.lines, self.total = offset, lines, total
+
+    def restore(self, filename: str, estimators: dict):
+        """
+        Replaces every estimator in the dict with its saved state (the classes are taken
+        from the estimators passed in) and returns (offset, lines, total).
+        """
+        data = read_file(self.path)
+        (offset, lines, total, fingerprint, count), pos = unpack_header("QQQIH", CKPT_MAGIC, data)
+        if os.path.getsize(filename) < offset or _fingerprint(filename, offset) != fingerprint:
+            raise ValueError(f"Checkpoint {self.path} was not written for the current contents of {filename}")
+        saved = {}
+        for _ in range(count):
+            blobs = []
+            for _ in range(2):
+                (size,) = _LENGTH.unpack_from(data, pos)
+                pos += _LENGTH.size
+                blobs.append(data[pos:pos + size])
+                pos += size
+            saved[blobs[0].decode()] = blobs[1]
+        missing = set(estimators) - set(saved)
+        if missing:
+            raise ValueError(f"Checkpoint {self.path} has no state for {', '.join(sorted(missing))}")
+        for name, estimator in estimators.items():
+            estimators[name] = type(estimator).from_bytes(saved[name])
+        self.offset, self.lines, self.total = offset, lines, total
+        return offset, lines, total
+
+    def track(self, filename: str, batches, estimators: dict):
+        """
+        Passes the (queries, offset, lines) batches of parsing.map_offset_batches through
+        as plain query lists and saves a checkpoint at a block edge once every_lines lines
+        or every_seconds seconds have gone by, plus one at the end.
+        The generator only resumes after the consumer has fed the previous batch, so a
+        checkpoint never includes a batch that was not counted yet.
+        """
+        lines, total = self.lines, self.total
+        offset = self.offset
+        saved_lines, saved_at = lines, time.monotonic()
+        for queries, block_end, block_lines in batches:
+            yield queries
+            total += len(queries)
+            if block_end is None:
+                continue
+            offset = block_end
+            lines += block_lines
+            if (lines - saved_lines >= self.every_lines
+                    or (self.every_seconds and time.monotonic() - saved_at >= self.every_seconds)):
+                self.save(filename, estimators, offset, lines, total)
+                saved_lines, saved_at = lines, time.monotonic()
+        if offset is not None and (offset, lines) != (self.offset, self.lines):
+            self.save(filename, estimators, offset, lines, total)
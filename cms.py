@@ -1,107 +1,446 @@
 import sys
-import hashlib
-from collections import defaultdict
+import argparse
 from typing import List, Tuple
 import time
-import hashlib
-import zlib
+import heapq
+from collections import Counter
+
+import numpy as np
+
+from parsing import mapped, map_batches, map_offset_batches, iter_query_bytes, to_text
+from hashers import HASHER_NAMES, make_hasher
+from checkpoint import Checkpoint
+from memory import PAIR_BYTES
+from profiling import Profiler, print_profile
+from evaluation import calculate_metrics, rank_heavy
+from sketch_io import pack_header, unpack_header, pack_entries, unpack_entries, write_atomic, read_file
+
+CMS_MAGIC = b"CMS6"
+
+# Update and point query policies:
+#   standard       - add the count to every counter, estimate with the minimum
+#   conservative   - only raise counters to the item's new minimum, estimate with the minimum
+#   count-mean-min - standard updates, estimate with the median of the rows after
+#                    subtracting each row's expected collision noise
+POLICIES = ("standard", "conservative", "count-mean-min")
+
+# What a narrow counter does when a count no longer fits:
+#   promote  - switch the whole table to the next wider type (uint16 -> uint32 -> uint64)
+#   saturate - stay at the type's maximum; estimates of those items are then capped
+OVERFLOW = ("promote", "saturate")
+COUNTER_TYPES = (np.uint16, np.uint32, np.uint64)
 
 class CountMinSketch:
-    def __init__(self, width: int = 10000, depth: int = 5):
+    def __init__(self, width: int = 10000, depth: int = 5, dtype=np.uint64, top_k: int = None,
+                 policy: str = "standard", hasher: str = "crc32-mix", seed: int = 0,
+                 power_of_two: bool = False, overflow: str = "promote"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}, expected one of {', '.join(POLICIES)}")
+        if overflow not in OVERFLOW:
+            raise ValueError(f"Unknown overflow mode {overflow!r}, expected one of {', '.join(OVERFLOW)}")
+        if power_of_two:
+            # Round up so columns can be taken with a bitmask instead of a modulo
+            width = 1 << (width - 1).bit_length()
 
         # CMS's advatage is that it uses fixed memory and provides probabilistic estimates.
         # Width and depth determine the accuracy and confidence of the estimates.
         # No matter how large the input stream is, the memory used remains constant.
         self.width = width
         self.depth = depth
-        # There's a lot of overhead with list of lists in Python, but it's simpler to implement.
-        self.table = [[0] * width for _ in range(depth)]
-        # Use 1D list or array.array for better cache locality and memory
-        # Stores integers as 4-byte unsigned integers similar to C's uint32_t
-        # Reducing overhead compared to list of lists
-        # self.table = [array.array('I', [0] * width) for _ in range(depth)] using the array library, optional
-        
-    def _get_hashes(self, item: str):
-        data = item.encode('utf-8')
+        # One contiguous depth x width array instead of a list of lists of int objects.
+        # Each cell is a fixed-size unsigned integer (uint64 by default; uint32 halves the memory
+        # and uint16 quarters it, with overflow handled as described by OVERFLOW).
+        self.table = np.zeros((depth, width), dtype=dtype)
+        # Flat view of the same buffer, used by the scalar path and by np.add.at
+        self._flat = self.table.reshape(-1)
+        # Buffer view of the same cells for the one-item path: indexing it reads and writes
+        # Python ints directly, without a NumPy scalar per counter
+        self._view = memoryview(self._flat)
+        self._limit = int(np.iinfo(self.table.dtype).max)
+        self.overflow = overflow
+        # Row i uses index (h1 + i * h2) % width, so precompute i and the row offsets.
+        # For a power of two width the modulo is the same as masking the low bits.
+        self._row_ids = np.arange(depth, dtype=np.uint64)
+        self._row_offsets = self._row_ids * np.uint64(width)
+        self._mask = width - 1 if width & (width - 1) == 0 else None
+        self.policy = policy
+        # Hash family and seed; see hashers.py
+        self.hasher = make_hasher(hasher, seed)
+        # Total count added, needed by count-mean-min to estimate the noise in a counter
+        self.n = 0
 
+        # Optional top-k mode: the k items with the highest estimates seen so far, so the
+        # heavy hitters come from the sketch itself instead of an exact count of every query.
+        # _top holds item -> latest estimate; _heap is a min-heap with one (estimate, item)
+        # entry per candidate. Minimum estimates never decrease, so a heap entry can only lag
+        # behind _top and is refreshed when it reaches the root. (Count-mean-min estimates can
+        # drift down a little as n grows, which at worst evicts a candidate that wasn't the smallest.)
+        self.top_k = top_k
+        self._top = {}
+        self._heap = []
+        
+    def _get_hashes(self, item):
         # Originally used hashlib.md5 and hashlib.sha1, but they are slower, since they are cryptographic hashes.
-        # Using zlib's crc32 and adler32 for faster non-cryptographic hashing.
-        # These produce 32-bit hash values, suitable for our needs.
-        h1 = zlib.crc32(data) & 0xffffffff # Bitwise AND to ensure unsigned integer
-        h2 = zlib.adler32(data) & 0xffffffff # Bitwise AND to ensure unsigned integer
-        return h1, h2
+        # zlib's crc32 is the fast non-cryptographic base of the default hasher; hashers.py has the options.
+        return self.hasher.pair(item)
+
+    def _get_indices(self, items: List[str], hashes: np.ndarray = None) -> np.ndarray:
+        """
+        Hashes a batch of normalized items and returns their flat table indices, shape (n, depth).
+        hashes skips the hashing when the items' (h1, h2) pairs are already known.
+        """
+        if hashes is None:
+            hashes = self.hasher.pairs(items)
+        h1 = hashes[:, 0:1]
+        h2 = hashes[:, 1:2]
+        # All depth row indices for the whole batch in one broadcasted step
+        if self._mask is not None:
+            return ((h1 + self._row_ids * h2) & np.uint64(self._mask)) + self._row_offsets
+        return (h1 + self._row_ids * h2) % np.uint64(self.width) + self._row_offsets
+
+    def _cells(self, h1: int, h2: int) -> List[int]:
+        """Flat table positions of one item, one per row."""
+        width = self.width
+        if self._mask is not None:
+            mask = self._mask
+            return [i * width + ((h1 + i * h2) & mask) for i in range(self.depth)]
+        return [i * width + (h1 + i * h2) % width for i in range(self.depth)]
+
+    def _fit(self, value: int) -> int:
+        """Returns what can be stored for value, promoting the counter type first if allowed."""
+        if value <= self._limit:
+            return value
+        if self.overflow == "saturate":
+            return self._limit
+        for wider in COUNTER_TYPES:
+            if np.iinfo(wider).max >= value:
+                break
+        self.table = self.table.astype(wider)
+        self._flat = self.table.reshape(-1)
+        self._view = memoryview(self._flat)
+        self._limit = int(np.iinfo(wider).max)
+        return value
 
     def add(self, item: str, count: int = 1):
         item = item.lower().strip()
-        h1, h2 = self._get_hashes(item)
-        for i in range(self.depth):
-            index = (h1 + i * h2) % self.width
-            self.table[i][index] += count
+        cells = self._cells(*self._get_hashes(item))
+        self.n += count
+        # Counters are read and written as Python ints through the buffer view. The view
+        # refuses a value its type can't hold, which is the only overflow check needed.
+        view = self._view
+        if self.policy == "conservative":
+            # Counters already above the new minimum are left alone, they cover the item anyway
+            values = [view[cell] for cell in cells]
+            target = min(values) + count
+            if target > self._limit:
+                target = self._fit(target)
+                view = self._view
+            for cell, value in zip(cells, values):
+                if value < target:
+                    view[cell] = target
+        else:
+            for cell in cells:
+                try:
+                    view[cell] += count
+                except ValueError:
+                    # Promote the table (or saturate the counter) and carry on with the new view
+                    value = self._fit(view[cell] + count)
+                    view = self._view
+                    view[cell] = value
+        if self.top_k:
+            self._offer(item, self._point(cells))
+
+    def _offer(self, item, estimate: int):
+        """Keeps item among the top-k candidates if its estimate beats the smallest one."""
+        top = self._top
+        if item in top:
+            top[item] = estimate
+            return
+        heap = self._heap
+        if len(top) < self.top_k:
+            top[item] = estimate
+            heapq.heappush(heap, (estimate, item))
+            return
+        # Bring the root up to date before comparing against it
+        while heap[0][0] != top[heap[0][1]]:
+            low = heap[0][1]
+            heapq.heapreplace(heap, (top[low], low))
+        if estimate > heap[0][0]:
+            _, evicted = heapq.heapreplace(heap, (estimate, item))
+            del top[evicted]
+            top[item] = estimate
+
+    def top_k_items(self, n: int = None) -> List[Tuple[str, int]]:
+        """
+        The n (default top_k) candidates with the highest estimates, largest first.
+        Candidates are re-estimated first, since later collisions may have raised them.
+        """
+        if not self.top_k:
+            raise ValueError("CountMinSketch was created without top_k")
+        items = list(self._top)
+        estimates = self.estimate_many(items).tolist() if items else []
+        self._top.update(zip(items, estimates))
+        ranked = sorted(zip(items, estimates), key=lambda x: x[1], reverse=True)
+        return ranked[:n or self.top_k]
+
+    def _reset_top(self, candidates):
+        """Rebuilds the candidate heap from (item, estimate) pairs, keeping the top_k largest."""
+        best = heapq.nlargest(self.top_k, candidates, key=lambda x: x[1])
+        self._top = dict(best)
+        self._heap = [(estimate, item) for item, estimate in best]
+        heapq.heapify(self._heap)
+
+    def add_many(self, items, counts=None, hashes=None):
+        """
+        Batch version of add(). Gives the same table as calling add() on every item.
+        counts, if given, is the increment for the item at the same position.
+        hashes, if given, are the items' pairs from this sketch's hasher and seed, shape (n, 2),
+        e.g. precomputed in a query cache; the items must then be normalized and distinct.
+        """
+        if hashes is not None:
+            # Already normalized and grouped, nothing to count or hash
+            items = list(items)
+            counts = np.asarray(counts, dtype=np.uint64)
+        else:
+            items = [item.lower().strip() for item in items]
+            if counts is None:
+                # Search logs repeat a lot, so hash each distinct query once per batch
+                grouped = Counter(items)
+            else:
+                # Conservative update needs each item once per batch, so repeats are summed
+                grouped = Counter()
+                for item, count in zip(items, counts):
+                    grouped[item] += count
+            items = list(grouped.keys())
+            counts = np.asarray(list(grouped.values()), dtype=np.uint64)
+        if not items:
+            return
+        self.n += int(counts.sum())
+        indices = self._get_indices(items, hashes)
+        if self.policy == "conservative":
+            # Raise every counter of an item to its old minimum plus its count. When items of
+            # the batch share a counter it keeps the largest target, so each item still gets
+            # its full count on top of its old estimate and nothing is underestimated.
+            # (Not cell-for-cell the same as add() in a loop, conservative update is order dependent.)
+            targets = self._flat[indices].min(axis=1).astype(np.uint64) + counts
+            if len(targets):
+                top = self._fit(int(targets.max()))
+                targets = np.minimum(targets, np.uint64(top))
+            np.maximum.at(self._flat, indices.ravel(), np.repeat(targets, self.depth).astype(self.table.dtype))
+        elif self._limit == np.iinfo(np.uint64).max:
+            # Unbuffered scatter-add, so repeated indices inside the batch are all counted
+            np.add.at(self._flat, indices.ravel(), np.repeat(counts, self.depth))
+        else:
+            # Narrow counters: total the batch per cell at 64 bits first, so overflow is seen
+            # before anything wraps. One pass over the table, which is small in this mode anyway.
+            totals = np.bincount(indices.ravel().astype(np.intp), weights=np.repeat(counts, self.depth),
+                                 minlength=self._flat.size).astype(np.uint64)
+            totals += self._flat
+            top = self._fit(int(totals.max()))
+            self._flat[...] = np.minimum(totals, np.uint64(top))
+        if self.top_k:
+            # One vectorized lookup gives every item's estimate after the whole batch
+            for item, estimate in zip(items, self._combine(self._flat[indices]).tolist()):
+                self._offer(item, estimate)
 
     def estimate(self, item: str) -> int:
         item = item.lower().strip()
-        h1, h2 = self._get_hashes(item)
-        res = float('inf')
-        for i in range(self.depth):
-            index = (h1 + i * h2) % self.width
-            res = min(res, self.table[i][index])
-        return int(res)
+        return self._point(self._cells(*self._get_hashes(item)))
+
+    def _point(self, cells: List[int]) -> int:
+        """estimate() from an item's cells: _combine for one item, in Python ints and floats."""
+        view = self._view
+        values = [view[cell] for cell in cells]
+        lowest = min(values)
+        if self.policy != "count-mean-min":
+            return lowest
+        # Same arithmetic as _combine; np.median costs more than the whole rest of the lookup
+        spread = max(self.width - 1, 1)
+        adjusted = sorted(value - (self.n - value) / spread for value in values)
+        middle = len(adjusted) // 2
+        median = adjusted[middle] if len(adjusted) % 2 else (adjusted[middle - 1] + adjusted[middle]) / 2
+        # round() is round-half-even like np.rint
+        return min(max(round(median), 0), lowest)
+
+    def _combine(self, values: np.ndarray) -> np.ndarray:
+        """Turns the counters of each item, shape (n, depth), into one estimate per item."""
+        lowest = values.min(axis=1)
+        if self.policy != "count-mean-min":
+            return lowest
+        # Any other item lands in a given counter with probability 1/width, so a row's
+        # expected noise is the rest of the stream spread over the other counters
+        values = values.astype(np.float64)
+        noise = (self.n - values) / max(self.width - 1, 1)
+        estimates = np.median(values - noise, axis=1)
+        # Never above the plain minimum, which is already an upper bound
+        return np.clip(np.rint(estimates), 0, lowest).astype(self.table.dtype)
+
+    def estimate_many(self, items) -> np.ndarray:
+        """Batch version of estimate(). Returns an array of estimates in the same order as items."""
+        items = [item.lower().strip() for item in items]
+        if not items:
+            return np.zeros(0, dtype=self.table.dtype)
+        return self._combine(self._flat[self._get_indices(items)])
+
+    def heavy_hitters(self, threshold, items=None):
+        """
+        The top-k candidates (or the given items, since a sketch can't list what it has seen)
+        with an estimate of at least threshold, largest first, as (items, estimates array).
+        """
+        if items is None:
+            if not self.top_k:
+                raise ValueError("CountMinSketch was created without top_k, pass the items to check")
+            items = list(self._top)
+        items = list(items)
+        return rank_heavy(items, self.estimate_many(items), threshold)
+
+    def nbytes(self) -> int:
+        """
+        Memory of the counter table plus the top-k candidates, if tracked. The table owns its
+        buffer, so getsizeof already includes table.nbytes; the candidates are at most top_k
+        keys, each in the dict and in one (estimate, item) heap entry.
+        """
+        total = sys.getsizeof(self.table)
+        if self.top_k:
+            total += (sys.getsizeof(self._top) + sum(map(sys.getsizeof, self._top))
+                      + sys.getsizeof(self._heap) + len(self._heap) * PAIR_BYTES)
+        return total
 
     def get_stats(self) -> dict:
-        """Calculates deep memory for List of Lists structure."""
-        # Start with the outer list
-        total_mem = sys.getsizeof(self.table)
-        for row in self.table:
-            # Add the inner list structure
-            total_mem += sys.getsizeof(row)
-            # Add the size of every integer object in the row
-            total_mem += sum(sys.getsizeof(cell) for cell in row)
-            
+        """Reports the memory of the counter table and top-k candidates; see nbytes."""
+        total_mem = self.nbytes()
+
         return {
             "width": self.width,
             "depth": self.depth,
+            "counter": self.table.dtype.name,
+            "buffer_bytes": self.table.nbytes,
+            "policy": self.policy,
+            "hasher": self.hasher.name,
             "memory_kb": total_mem / 1024,
             "memory_mb": total_mem / (1024 * 1024)
         }
 
-def process_aol_dataset(filepath: str, cms: CountMinSketch, limit=None) -> Tuple[int, dict]:
-    query_freq = defaultdict(int)
+    def merge(self, other: "CountMinSketch"):
+        """
+        Adds another sketch into this one, cell by cell.
+        Both sketches must share width, depth, hashing and policy, e.g. built on different shards.
+        The result is exactly the sketch of the concatenated streams, except with conservative
+        update, where the sum is still never below the true counts but is looser than one
+        sketch built over the whole stream.
+        """
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError(
+                f"Cannot merge {other.width}x{other.depth} sketch into {self.width}x{self.depth} sketch"
+            )
+        if self.policy != other.policy:
+            raise ValueError(f"Cannot merge a {other.policy} sketch into a {self.policy} sketch")
+        if (self.hasher.name, self.hasher.seed) != (other.hasher.name, other.hasher.seed):
+            raise ValueError("Cannot merge sketches built with different hashers or seeds")
+        # Summed at 64 bits so narrow counters can be promoted (or saturated) instead of wrapping
+        total = self.table.astype(np.uint64) + other.table.astype(np.uint64)
+        top = self._fit(int(total.max()))
+        self.table[...] = np.minimum(total, np.uint64(top))
+        self.n += other.n
+        if self.top_k:
+            # Candidates of both sides, re-estimated on the merged table
+            items = list(self._top.keys() | other._top.keys())
+            if items:
+                self._reset_top(zip(items, self.estimate_many(items).tolist()))
+        return self
+
+    def to_bytes(self) -> bytes:
+        """
+        Header (magic, width, depth, counter type, top_k or 0, policy, n, hasher, seed, overflow),
+        the raw little-endian table, then the top-k candidates and their estimates when top-k mode is on.
+        """
+        # dtype.str ("<u8") names the byte order and width; a type code like "L" is per platform
+        dtype = self.table.dtype.newbyteorder("<")
+        header = pack_header("II3sIBQBQB", CMS_MAGIC, self.width, self.depth, dtype.str.encode(),
+                             self.top_k or 0, POLICIES.index(self.policy), self.n,
+                             HASHER_NAMES.index(self.hasher.name), self.hasher.seed,
+                             OVERFLOW.index(self.overflow))
+        data = header + self.table.astype(dtype, copy=False).tobytes()
+        if self.top_k:
+            data += pack_entries(self._top.keys(), self._top.values())
+        return data
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CountMinSketch":
+        (width, depth, code, top_k, policy, n, hasher, seed, overflow), offset = unpack_header(
+            "II3sIBQBQB", CMS_MAGIC, data)
+        dtype = np.dtype(code.decode())
+        cms = cls(width=width, depth=depth, dtype=dtype.newbyteorder("="), top_k=top_k or None,
+                  policy=POLICIES[policy], hasher=HASHER_NAMES[hasher], seed=seed,
+                  overflow=OVERFLOW[overflow])
+        cms.n = n
+        table = np.frombuffer(data, dtype=dtype, count=width * depth, offset=offset)
+        cms.table[...] = table.reshape(depth, width)
+        if top_k:
+            items, (estimates,), _ = unpack_entries(data, offset + table.nbytes, 1)
+            cms._reset_top(zip(items, estimates))
+        return cms
+
+    def save(self, path: str):
+        write_atomic(path, self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "CountMinSketch":
+        return cls.from_bytes(read_file(path))
+
+def process_aol_dataset(filepath: str, cms: CountMinSketch, limit=None, exact=True,
+                        checkpoint=None, resume=False, profiler=None) -> Tuple[int, dict]:
+    """
+    Feeds the memory-mapped log into the sketch and counts exact frequencies for evaluation.
+    Queries stay lowercased bytes the whole way; decode with parsing.to_text for display.
+    limit counts lines from the top of the file, header included.
+    With exact=False no exact counts are kept and the returned dict is empty.
+
+    With a checkpoint.Checkpoint the sketch and exact counts are saved as the file is read.
+    resume=True continues from a saved checkpoint: cms must be fresh, the saved sketch is
+    merged into it, and only the lines after the saved offset are read.
+    A profiling.Profiler, if given, is passed on to the parser and main.feed_estimators.
+    """
+    # Imported here since main imports this module
+    from main import GroundTruth, feed_estimators
+    query_freq = GroundTruth()
+    estimators = {"cms": cms, "gt": query_freq} if exact else {"cms": cms}
     total_queries = 0
     
     print(f"File path : {filepath}")
     
     try:
-        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-            first_line = f.readline().lower()
-            if not ('anon' in first_line or 'query' in first_line):
-                parts = first_line.split('\t')
-                if len(parts) >= 2:
-                    query = parts[1].strip()
-                    if query and query not in ['-', '', '""', "''"]:
-                        cms.add(query)
-                        query_freq[query] += 1
-                        total_queries += 1
-            
-            for line_num, line in enumerate(f, start=2):
-                if limit and line_num > limit:
-                    break
-
-                line = line.strip()
-                if not line:
-                    continue
-                
-                parts = line.split('\t')
-                if len(parts) < 2:
-                    continue
-                
-                query = parts[1].strip()
-                if query and query not in ['-', '', '""', "''"]:
-                    cms.add(query)
-                    query_freq[query] += 1
-                    total_queries += 1
-                
-                if total_queries % 10000 == 0:
-                    print(f"Total number of queries : {total_queries:,}")
+        with mapped(filepath) as buf:
+            # Only skip the first line if it is the AnonID/Query header
+            first_end = buf.find(b'\n') + 1 or len(buf)
+            first_line = buf[:first_end].lower()
+            has_header = b'anon' in first_line or b'query' in first_line
+            start = first_end if has_header else 0
+            max_lines = None if limit is None else max(limit - 1 if has_header else limit, 0)
+
+            if resume and checkpoint.exists():
+                if cms.n:
+                    raise ValueError("Resuming needs a fresh sketch to load the checkpoint into")
+                start, lines_done, total_queries = checkpoint.restore(filepath, estimators)
+                cms.merge(estimators["cms"])
+                estimators["cms"] = cms
+                if exact:
+                    query_freq = estimators["gt"]
+                print(f"Resuming at byte {start:,} after {lines_done:,} lines")
+                if max_lines is not None:
+                    max_lines -= lines_done
+
+            if max_lines is not None and max_lines <= 0:
+                # The limit ends at the header or was already reached; the readers take 0 as no limit
+                return total_queries, dict(query_freq)
+
+            if checkpoint:
+                batches = checkpoint.track(filepath, map_offset_batches(
+                    buf, start, len(buf), max_lines=max_lines, batch_size=10000, profiler=profiler), estimators)
+            else:
+                batches = map_batches(buf, start, len(buf), max_lines=max_lines, batch_size=10000,
+                                      profiler=profiler)
+            total_queries += feed_estimators(batches, estimators, profiler=profiler)[0]
     
     except FileNotFoundError:
         print(f"Error: File '{filepath}' not found.")
@@ -116,69 +455,158 @@ def process_aol_dataset(filepath: str, cms: CountMinSketch, limit=None) -> Tuple
 def get_top_queries(query_freq: dict, n: int = 10) -> List[Tuple[str, int]]:
     return sorted(query_freq.items(), key=lambda x: x[1], reverse=True)[:n]
 
-def calculate_metrics(gt_data, algorithm_data, total_n, threshold_ratio=0.001):
-    threshold = total_n * threshold_ratio
-    abs_errors = []
-    rel_errors = []
-    
-    # Only evaluate items that are actually "Heavy"
-    heavy_hitters = {k: v for k, v in gt_data.items() if v >= threshold}
-    
-    for query, actual in heavy_hitters.items():
-        est = algorithm_data.get(query, 0)
-        error = abs(actual - est)
-        abs_errors.append(error)
-        rel_errors.append(error / actual)
-        
-    avg_abs = sum(abs_errors) / len(abs_errors) if abs_errors else 0
-    avg_rel = sum(rel_errors) / len(rel_errors) if rel_errors else 0
-    
-    return avg_abs, avg_rel, len(heavy_hitters)
+def benchmark_hashers(filepath: str, limit=None, width: int = 10000, depth: int = 5, seed: int = 12345):
+    """
+    Compares the hash families on the same queries: hashing cost per item (batch and
+    one item at a time) and the collision-driven error of a sketch built with each.
+    The seeded rows rerun a hasher with a non-zero seed, i.e. a different member of the family.
+    """
+    batches = list(iter_query_bytes(filepath, max_lines=limit))
+    total = sum(len(batch) for batch in batches)
+    gt_data = Counter()
+    for batch in batches:
+        gt_data.update(batch)
+    items = list(gt_data)
+    actual = np.fromiter(gt_data.values(), dtype=np.float64, count=len(items))
+    sample = items[:100000]
+
+    print(f"Hasher benchmark: {total:,} queries, {len(items):,} unique, {width}x{depth} table")
+    print(f"{'HASHER':<26} | {'BATCH ns/item':<13} | {'ONE ns/item':<11} | {'HH ABS ERR':<10} | {'HH REL ERR':<10} | {'ALL ABS ERR':<11}")
+    print("-" * 96)
+    runs = [(name, 0) for name in HASHER_NAMES] + [(name, seed) for name in HASHER_NAMES]
+    for name, run_seed in runs:
+        hasher = make_hasher(name, run_seed)
+        t0 = time.perf_counter()
+        for batch in batches:
+            hasher.pairs(batch)
+        batch_ns = (time.perf_counter() - t0) / total * 1e9
+        t0 = time.perf_counter()
+        for item in sample:
+            hasher.pair(item)
+        one_ns = (time.perf_counter() - t0) / len(sample) * 1e9
+
+        cms = CountMinSketch(width=width, depth=depth, hasher=name, seed=run_seed)
+        for batch in batches:
+            cms.add_many(batch)
+        estimates = cms.estimate_many(items).astype(np.float64)
+        avg_abs, avg_rel, _ = calculate_metrics(gt_data, cms, total)
+        # Every unit of overestimate comes from a collision, so the mean over all queries
+        # shows how evenly the hasher spreads them
+        all_abs = float(np.mean(estimates - actual)) if items else 0.0
+
+        label = f"{name} (seed {run_seed})" if run_seed else name
+        print(f"{label:<26} | {batch_ns:<13.0f} | {one_ns:<11.0f} | {avg_abs:<10.2f} | {f'{avg_rel*100:.2f}%':<10} | {all_abs:<11.2f}")
 
 
 def main():
     filepath = "clean.txt"
     width = 10000
     depth = 5
-    limit = sys.argv[1] if len(sys.argv) > 1 else None
-    if limit:
-        limit = int(limit)
+    parser = argparse.ArgumentParser(description="Count-Min Sketch for the AOL dataset.")
+    parser.add_argument("limit", nargs="?", type=int, default=None, help="Stop after line N (header included)")
+    parser.add_argument("--workers", type=int, default=1, help="Ingest file chunks in N processes and merge")
+    parser.add_argument("--no-exact", action="store_true",
+                        help="Skip the exact counts; the top 10 then comes from the sketch alone")
+    parser.add_argument("--policy", choices=POLICIES, default="standard", help="Update and point query policy")
+    parser.add_argument("--hasher", choices=HASHER_NAMES, default="crc32-mix", help="Hash family, see hashers.py")
+    parser.add_argument("--seed", type=int, default=0, help="Hasher seed")
+    parser.add_argument("--compact", action="store_true",
+                        help="Power-of-two width with uint16 counters, promoted to wider types on overflow")
+    parser.add_argument("--overflow", choices=OVERFLOW, default="promote",
+                        help="What a narrow counter does when a count no longer fits")
+    parser.add_argument("--checkpoint", metavar="PATH", default=None,
+                        help="Save the sketch and the read position to PATH while reading")
+    parser.add_argument("--checkpoint-every", type=int, default=1_000_000, metavar="LINES",
+                        help="Lines between checkpoints (saved at the next block edge)")
+    parser.add_argument("--checkpoint-seconds", type=float, default=None, metavar="T",
+                        help="Also save a checkpoint after T seconds")
+    parser.add_argument("--resume", action="store_true", help="Continue from the --checkpoint file if it exists")
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="Time the ingestion phases and write the profile to PATH as JSON")
+    parser.add_argument("--benchmark-hashers", action="store_true",
+                        help="Compare the speed and error of every hasher, then exit")
+    args = parser.parse_args()
+    limit = args.limit
+    exact = not args.no_exact
+
+    if args.benchmark_hashers:
+        benchmark_hashers(filepath, limit=limit, width=width, depth=depth)
+        return
+    if args.workers > 1 and (args.hasher, args.seed) != ("crc32-mix", 0):
+        parser.error("--workers uses the registry sketches, which hash with crc32-mix and seed 0")
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint")
+    if args.workers > 1 and args.checkpoint:
+        parser.error("--checkpoint follows a single reader, it can't be combined with --workers")
+    if args.workers > 1 and args.profile:
+        parser.error("--profile times a single process, without --workers")
+    if args.workers > 1 and args.compact:
+        parser.error("--workers uses the registry sketches, which have a plain width and uint64 counters")
     
     print("Count-Min Sketch for AOL Dataset")
     
-    cms = CountMinSketch(width=width, depth=depth)
+    cms = CountMinSketch(width=width, depth=depth, top_k=100, policy=args.policy,
+                         hasher=args.hasher, seed=args.seed, overflow=args.overflow,
+                         **({"dtype": np.uint16, "power_of_two": True} if args.compact else {}))
 
     startTime = time.perf_counter()
     
-    total_queries, query_freq = process_aol_dataset(filepath, cms, limit=limit)
+    if args.workers > 1:
+        # Each worker builds a sketch (and the exact counts used for evaluation) on its own chunk
+        from parallel import run_parallel
+        sketch = {"standard": "cmstop", "conservative": "cmscutop", "count-mean-min": "cmscmmtop"}[args.policy]
+        names = [sketch, "gt"] if exact else [sketch]
+        total_queries, estimators, _, _, _ = run_parallel(
+            filepath, names, args.workers, max_lines=None if limit is None else max(limit - 1, 0))
+        cms.merge(estimators[sketch])
+        query_freq = dict(estimators["gt"]) if exact else {}
+    else:
+        checkpoint = None
+        if args.checkpoint:
+            checkpoint = Checkpoint(args.checkpoint, args.checkpoint_every, args.checkpoint_seconds)
+        profiler = Profiler().start() if args.profile else None
+        total_queries, query_freq = process_aol_dataset(filepath, cms, limit=limit, exact=exact,
+                                                        checkpoint=checkpoint, resume=args.resume,
+                                                        profiler=profiler)
+        if profiler:
+            profiler.save(args.profile)
+            print_profile(profiler.report())
+            print(f"Profile → {args.profile}")
 
     endTime = time.perf_counter()
     print(f"\nProcessing completed in {endTime - startTime:.2f} seconds.\n")
-    unique_queries = len(query_freq)
     
     print("Statistics")
     print(f"Total queries processed: {total_queries:,}")
-    print(f"Unique queries: {unique_queries:,}")
+    if exact:
+        print(f"Unique queries: {len(query_freq):,}")
     
     stats = cms.get_stats()
     print(f"\nCount-Min Sketch Configuration:")
     print(f"  Width: {stats['width']:,}")
     print(f"  Depth: {stats['depth']}")
+    print(f"  Policy: {stats['policy']}")
+    print(f"  Hasher: {stats['hasher']}")
     print(f"  Total cells: {stats['width'] * stats['depth']:,}")
+    print(f"  Counter type: {stats['counter']} ({stats['buffer_bytes']:,} bytes of counters)")
     print(f"  Approximate memory: {stats['memory_kb']:.2f} KB ({stats['memory_mb']:.2f} MB)")
     
 
+    # Straight from the sketch's candidate heap, the exact counts are only used for comparison
     print("Top 10 Most Frequent Queries")
-    top_queries = get_top_queries(query_freq, 10)
-    for rank, (query, count) in enumerate(top_queries, 1):
-        estimated = cms.estimate(query)
-        print(f"{rank:2d}. {query[:50]:<50} | Actual: {count:5d} | Estimated: {estimated:5d}")
+    for rank, (query, estimated) in enumerate(cms.top_k_items(10), 1):
+        if exact:
+            print(f"{rank:2d}. {to_text(query)[:50]:<50} | Actual: {query_freq.get(query, 0):5d} | Estimated: {estimated:5d}")
+        else:
+            print(f"{rank:2d}. {to_text(query)[:50]:<50} | Estimated: {estimated:5d}")
 
-    avg_abs, avg_rel, _ = calculate_metrics(query_freq, {q: cms.estimate(q) for q in query_freq}, total_queries)
+    if exact:
+        # Only the heavy hitters are estimated, in one batch
+        avg_abs, avg_rel, _ = calculate_metrics(query_freq, cms, total_queries)
 
-    print("\nOverall Error Metrics for Heavy Hitters (Threshold: 0.001)")
-    print(f"\nAverage Absolute Error for Heavy Hitters: {avg_abs:.2f}")
-    print(f"\nAverage Relative Error for Heavy Hitters: {avg_rel*100:.2f}%")
+        print("\nOverall Error Metrics for Heavy Hitters (Threshold: 0.001)")
+        print(f"\nAverage Absolute Error for Heavy Hitters: {avg_abs:.2f}")
+        print(f"\nAverage Relative Error for Heavy Hitters: {avg_rel*100:.2f}%")
     
     print("Interactive Query Mode")
     print("Enter search queries to estimate their frequency.")
@@ -195,10 +623,15 @@ def main():
             elif query == '':
                 continue
             
-            estimate = cms.estimate(query)
-            actual = query_freq.get(query.lower(), 0)
+            # Sketch and counts are keyed by the parser's bytes, which only fold ASCII case
+            key = query.encode('utf-8').lower().strip()
+            estimate = cms.estimate(key)
+            actual = query_freq.get(key, 0)
             
             print(f"  Estimated frequency: {estimate}")
+            if not exact:
+                print()
+                continue
             print(f"  Actual frequency: {actual}")
             if actual > 0:
                 error = abs(estimate - actual)
@@ -0,0 +1,117 @@
+import math
+import random
+import itertools
+from collections import Counter
+
+import numpy as np
+
+def lookup(counts: dict, items, default=0, dtype=np.int64) -> np.ndarray:
+    """counts.get(item, default) for every item as an array, without a Python-level loop."""
+    items = items if isinstance(items, (list, tuple)) else list(items)
+    return np.fromiter(map(counts.get, items, itertools.repeat(default)), dtype=dtype, count=len(items))
+
+def rank_heavy(items, estimates: np.ndarray, threshold):
+    """
+    The items whose estimate is at least threshold, largest first, as (items, estimates array);
+    what the estimators' heavy_hitters return.
+    """
+    keep = np.flatnonzero(estimates >= threshold)
+    keep = keep[np.argsort(-estimates[keep].astype(np.float64), kind="stable")]
+    return [items[i] for i in keep.tolist()], estimates[keep]
+
+def calculate_metrics(gt_data, algorithm_data, total_n, threshold_ratio=0.001):
+    """
+    (avg abs error, avg rel error, heavy hitters) of algorithm_data over the items of gt_data
+    with a count of at least threshold_ratio * total_n. gt_data only needs to hold those
+    items, e.g. the exact counts of a candidate set from count_candidates.
+    algorithm_data is a dict of estimates (missing items count as 0) or an estimator with
+    estimate_many, which is then asked for the heavy hitters only, in one batch.
+    """
+    threshold = total_n * threshold_ratio
+    keys = list(gt_data)
+    actual = np.fromiter(gt_data.values(), dtype=np.float64, count=len(keys))
+
+    # Only evaluate items that are actually "Heavy"
+    heavy = actual >= threshold
+    heavy_hitters = list(itertools.compress(keys, heavy.tolist()))
+    if not heavy_hitters:
+        return 0, 0, 0
+    actual = actual[heavy]
+
+    if hasattr(algorithm_data, "estimate_many"):
+        estimates = np.asarray(algorithm_data.estimate_many(heavy_hitters), dtype=np.float64)
+    else:
+        estimates = lookup(algorithm_data, heavy_hitters, dtype=np.float64)
+    errors = np.abs(actual - estimates)
+
+    return float(errors.mean()), float((errors / actual).mean()), len(heavy_hitters)
+
+
+class Reservoir:
+    """
+    Uniform sample of `size` stream positions (Li's Algorithm L). Instead of drawing a
+    random number per item it draws how many items to skip before the next replacement,
+    so a batch costs a slice plus one step per replacement, and replacements get rarer as
+    the stream grows. Since positions are sampled, frequent queries show up more often.
+    Has add_many, so main.feed_estimators feeds it like a sketch.
+    """
+
+    def __init__(self, size: int = 10000, seed: int = 0):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.size = size
+        self.n = 0
+        self.items = []
+        self._rng = random.Random(seed)
+        self._w = math.exp(math.log(self._random()) / size)
+        # Stream position of the next replacement
+        self._next = size + self._skip()
+
+    def _random(self) -> float:
+        # random() can return 0.0, which has no logarithm
+        return self._rng.random() or 1e-300
+
+    def _skip(self) -> int:
+        return int(math.log(self._random()) / math.log1p(-self._w)) if self._w < 1 else 0
+
+    def add_many(self, items):
+        start = self.n
+        self.n += len(items)
+        if len(self.items) < self.size:
+            self.items.extend(items[:self.size - len(self.items)])
+        while self._next < self.n:
+            self.items[self._rng.randrange(self.size)] = items[self._next - start]
+            self._w *= math.exp(math.log(self._random()) / self.size)
+            self._next += self._skip() + 1
+
+    def add(self, item):
+        self.add_many([item])
+
+
+def candidates(estimators, extra=()) -> set:
+    """
+    Every item the estimators report: the tracked items of the counter summaries and the
+    top-k candidates of the sketches that keep them, plus `extra` (e.g. a Reservoir's items).
+    Misra-Gries and Space-Saving with k counters track every item above n / k, so with
+    epsilon below the heavy hitter threshold the set holds all the true heavy hitters.
+    """
+    found = set(extra)
+    for estimator in estimators.values():
+        if getattr(estimator, "top_k", None):
+            found.update(item for item, _ in estimator.top_k_items())
+        elif hasattr(estimator, "counts"):
+            found.update(estimator.counts)
+    return found
+
+def count_candidates(batches, wanted: set, counts: Counter = None) -> Counter:
+    """
+    Exact counts of just the wanted items over a second pass of the stream; memory is
+    bounded by the candidate set however many distinct queries the stream has.
+    counts, if given, is the Counter (e.g. main.GroundTruth) to count into.
+    """
+    counts = Counter() if counts is None else counts
+    keep = wanted.__contains__
+    for batch in batches:
+        # filter and Counter.update both loop in C
+        counts.update(filter(keep, batch))
+    return counts
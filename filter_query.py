@@ -1,44 +1,162 @@
-import sys
+import os
+import bz2
+import glob
+import gzip
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
-def filter_aol_queries(input_file, clean_output, invalid_output):
+from hashers import HASHER_NAMES
+
+# Invalid (empty/dash) query fields, compared after strip
+INVALIDS = (b'', b'-', b'""', b"''")
+
+# Lines collected before one writelines() call, and the output buffer size
+WRITE_LINES = 1 << 16
+WRITE_BUFFER = 1 << 22
+
+# Compressed inputs are decompressed while they are read
+OPENERS = {'.gz': gzip.open, '.bz2': bz2.open}
+
+def open_log(path):
+    """Binary line reader for a plain, .gz or .bz2 log."""
+    return OPENERS.get(os.path.splitext(path)[1], open)(path, 'rb')
+
+def _is_output(path, outputs):
+    """True for one of the outputs or a .partN file a multi-file run leaves next to it."""
+    path = os.path.realpath(path)
+    return any(path == output or (path.startswith(output + '.part') and path[len(output) + 5:].isdigit())
+               for output in outputs)
+
+def expand_inputs(source, outputs=()):
     """
-    Reads an AOL search log file, writes:
-      - valid query lines to clean_output
-      - invalid (empty/dash) query lines to invalid_output
+    A log file, a glob pattern or a directory of logs, as a sorted list of files.
+    The outputs and their part files are left out, so a rerun never filters its own output.
     """
+    outputs = [os.path.realpath(path) for path in outputs]
+    if os.path.isdir(source):
+        files = sorted(path for path in glob.glob(os.path.join(source, '*'))
+                       if os.path.isfile(path) and path.endswith(('.txt', '.gz', '.bz2')))
+    elif os.path.exists(source):
+        files = [source]
+    else:
+        files = sorted(glob.glob(source))
+    files = [path for path in files if not _is_output(path, outputs)]
+    if not files:
+        raise FileNotFoundError(f"No log files match {source!r}")
+    return files
 
-    def is_invalid_query(query):
-        # Normalize
-        q = query.strip()
-        invalids = ['', '-', '""', "''"]
-        # consider blank / whitespace as invalid
-        return not q or q in invalids
-
-    with open(input_file, 'r', encoding='utf-8', errors='ignore') as fin, \
-         open(clean_output, 'w', encoding='utf-8') as fout_clean, \
-         open(invalid_output, 'w', encoding='utf-8') as fout_invalid:
+def filter_file(input_file, clean_output, invalid_output, keep_header=True):
+    """
+    Splits one log into clean and invalid lines, bytes in and bytes out.
+    keep_header=False drops the AnonID header line, for logs appended after the first one.
+    Returns {"file", "lines", "valid", "invalid", "seconds"}.
+    """
+    start = time.perf_counter()
+    lines = valid = 0
+    clean, invalid = [], []
+    with open_log(input_file) as fin, \
+         open(clean_output, 'wb', buffering=WRITE_BUFFER) as fout_clean, \
+         open(invalid_output, 'wb', buffering=WRITE_BUFFER) as fout_invalid:
 
         for line in fin:
-            parts = line.split('\t')
-            # If line too short or missing query field -> treat as invalid
-            if len(parts) < 2:
-                fout_invalid.write(line)
+            if lines == 0 and line[:6].lower() == b'anonid':
+                # The header's query field reads "Query", so it would land in the clean file
+                if keep_header:
+                    fout_clean.write(line)
                 continue
-
-            query = parts[1]
-            if is_invalid_query(query):
-                fout_invalid.write(line)
+            lines += 1
+            parts = line.split(b'\t', 2)
+            # If line too short or missing query field -> treat as invalid
+            if len(parts) < 2 or parts[1].strip() in INVALIDS:
+                invalid.append(line)
             else:
-                fout_clean.write(line)
+                clean.append(line)
+            if len(clean) >= WRITE_LINES:
+                valid += len(clean)
+                fout_clean.writelines(clean)
+                clean = []
+            if len(invalid) >= WRITE_LINES:
+                fout_invalid.writelines(invalid)
+                invalid = []
+        valid += len(clean)
+        fout_clean.writelines(clean)
+        fout_invalid.writelines(invalid)
 
-if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Usage: python filter_aol.py <input log> <clean out> <invalid out>")
-        sys.exit(1)
+    return {"file": input_file, "lines": lines, "valid": valid, "invalid": lines - valid,
+            "seconds": time.perf_counter() - start}
+
+def _concat(parts, output):
+    with open(output, 'wb') as fout:
+        for part in parts:
+            with open(part, 'rb') as fin:
+                shutil.copyfileobj(fin, fout, WRITE_BUFFER)
+                # An input whose last line has no newline would run into the next part's first line
+                if fin.tell():
+                    fin.seek(-1, os.SEEK_END)
+                    if fin.read(1) != b'\n':
+                        fout.write(b'\n')
+            os.remove(part)
+
+def filter_aol_queries(input_file, clean_output, invalid_output, cache_output=None, cache_hasher=None,
+                       cache_seed=0, workers=1):
+    """
+    Reads AOL search logs (one file, a glob or a directory; plain, .gz or .bz2), writes:
+      - valid query lines to clean_output
+      - invalid (empty/dash) query lines to invalid_output
+      - optionally, the normalized queries of clean_output as a query cache (see query_cache.py),
+        with the hashes of cache_hasher precomputed if given
+    Several files are filtered in a process pool into part files next to the outputs, then
+    joined in file order with a single header line.
+    Returns {"files": [per-file stats from filter_file], "cache": (queries, distinct) or None}.
+    """
+    files = expand_inputs(input_file, (clean_output, invalid_output))
+    if len(files) == 1:
+        stats = [filter_file(files[0], clean_output, invalid_output)]
+    else:
+        parts = [(f"{clean_output}.part{i}", f"{invalid_output}.part{i}") for i in range(len(files))]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(filter_file, path, clean, invalid, i == 0)
+                       for i, (path, (clean, invalid)) in enumerate(zip(files, parts))]
+            stats = [future.result() for future in futures]
+        _concat([clean for clean, _ in parts], clean_output)
+        _concat([invalid for _, invalid in parts], invalid_output)
 
-    input_log = sys.argv[1]
-    clean_file = sys.argv[2]
-    invalid_file = sys.argv[3]
+    cached = None
+    if cache_output:
+        # Built from the clean file with the estimators' own parser, so the normalization matches
+        from query_cache import cache_log
+        cached = cache_log(clean_output, cache_output, cache_hasher, cache_seed)
+    return {"files": stats, "cache": cached}
+
+def print_report(stats):
+    print(f"{'FILE':<40} | {'LINES':<12} | {'LINES/S':<12} | {'VALID':<8} | {'INVALID':<8}")
+    print("-" * 92)
+    for row in stats:
+        lines = max(row["lines"], 1)
+        print(f"{os.path.basename(row['file'])[:40]:<40} | {row['lines']:<12,} | "
+              f"{row['lines'] / max(row['seconds'], 1e-9):<12,.0f} | "
+              f"{f'{row['valid'] / lines * 100:.2f}%':<8} | {f'{row['invalid'] / lines * 100:.2f}%':<8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split AOL logs into clean and invalid query lines.")
+    parser.add_argument("input_log", help="Log file, glob pattern or directory; .gz and .bz2 are read directly")
+    parser.add_argument("clean_file")
+    parser.add_argument("invalid_file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes for several input files")
+    parser.add_argument("--cache", metavar="PATH", default=None,
+                        help="Also write the normalized clean queries as a binary query cache")
+    parser.add_argument("--cache-hasher", choices=HASHER_NAMES, default=None,
+                        help="Precompute this hasher's pairs in the cache for Count-Min ingestion")
+    parser.add_argument("--cache-seed", type=int, default=0)
+    args = parser.parse_args()
 
-    filter_aol_queries(input_log, clean_file, invalid_file)
-    print(f"Done! Clean queries → {clean_file}, invalid → {invalid_file}")
+    start = time.perf_counter()
+    result = filter_aol_queries(args.input_log, args.clean_file, args.invalid_file,
+                                args.cache, args.cache_hasher, args.cache_seed, workers=args.workers)
+    print_report(result["files"])
+    print(f"Done in {time.perf_counter() - start:.2f} seconds! "
+          f"Clean queries → {args.clean_file}, invalid → {args.invalid_file}")
+    if result["cache"]:
+        print(f"Query cache → {args.cache} ({result['cache'][0]:,} queries, {result['cache'][1]:,} distinct)")
@@ -0,0 +1,102 @@
+import abc
+import zlib
+import hashlib
+from typing import List, Tuple
+
+import numpy as np
+
+# Hash families for the Count-Min Sketch. Every hasher turns an item into the pair (h1, h2)
+# used for Kirsch-Mitzenmacher double hashing: row i uses column (h1 + i * h2) % width.
+# A sketch can only be merged with one built with the same hasher and seed.
+
+MASK32 = 0xffffffff
+MASK64 = 0xffffffffffffffff
+
+def as_bytes(item) -> bytes:
+    # Queries from the bytes parser are hashed as they are, str is encoded first
+    return item.encode('utf-8') if isinstance(item, str) else item
+
+class Hasher(abc.ABC):
+    """Base class: pair() hashes one item, pairs() a whole batch into an (n, 2) uint64 array."""
+    name = None
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+
+    @abc.abstractmethod
+    def pair(self, item) -> Tuple[int, int]:
+        ...
+
+    def pairs(self, items: List) -> np.ndarray:
+        return np.array([self.pair(item) for item in items], dtype=np.uint64).reshape(-1, 2)
+
+class CrcAdlerHasher(Hasher):
+    """
+    The original pair: crc32 and adler32, two C calls per item.
+    Adler32 is poorly spread on short inputs (its sums barely leave the low bits),
+    so h2 repeats a lot across short queries.
+    """
+    name = "crc32-adler32"
+
+    def pair(self, item) -> Tuple[int, int]:
+        data = as_bytes(item)
+        seed = self.seed & MASK32
+        # Bitwise AND to ensure unsigned integer
+        return zlib.crc32(data, seed) & MASK32, zlib.adler32(data, seed or 1) & MASK32
+
+class CrcMixHasher(Hasher):
+    """
+    Single hash: one crc32 call, then the splitmix64 finalizer spreads crc32 and the length
+    over 64 bits, split into two 32-bit halves. The finalizer is plain integer arithmetic,
+    so the batch path runs it vectorized in NumPy and only the crc32 call is per item.
+    Items only collide in every row if their crc32 and length both match.
+    """
+    name = "crc32-mix"
+
+    def pair(self, item) -> Tuple[int, int]:
+        data = as_bytes(item)
+        z = (zlib.crc32(data, self.seed & MASK32) | (len(data) << 32)) ^ (self.seed << 32)
+        z = (z + 0x9e3779b97f4a7c15) & MASK64
+        z = ((z ^ (z >> 30)) * 0xbf58476d1ce4e5b9) & MASK64
+        z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & MASK64
+        z ^= z >> 31
+        # Odd h2, so the rows never all land on the same column when width is a power of two
+        return z & MASK32, (z >> 32) | 1
+
+    def pairs(self, items: List) -> np.ndarray:
+        seed = self.seed & MASK32
+        data = [as_bytes(item) for item in items]
+        z = np.fromiter((zlib.crc32(d, seed) for d in data), dtype=np.uint64, count=len(data))
+        z |= np.fromiter((len(d) for d in data), dtype=np.uint64, count=len(data)) << np.uint64(32)
+        z ^= np.uint64((self.seed << 32) & MASK64)
+        # uint64 arrays wrap on overflow, which is the mod 2**64 the finalizer needs
+        z += np.uint64(0x9e3779b97f4a7c15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+        z ^= z >> np.uint64(31)
+        return np.stack([z & np.uint64(MASK32), (z >> np.uint64(32)) | np.uint64(1)], axis=1)
+
+class Blake2bHasher(Hasher):
+    """
+    hashlib.blake2b with an 8-byte digest, split into two 32-bit halves.
+    Well distributed but a few times slower than the zlib checksums.
+    A non-zero seed becomes the blake2b salt.
+    """
+    name = "blake2b"
+
+    def __init__(self, seed: int = 0):
+        super().__init__(seed)
+        self._salt = (seed & ((1 << 128) - 1)).to_bytes(16, 'little')
+
+    def pair(self, item) -> Tuple[int, int]:
+        z = int.from_bytes(hashlib.blake2b(as_bytes(item), digest_size=8, salt=self._salt).digest(), 'little')
+        return z & MASK32, (z >> 32) | 1
+
+# Registry by name; the position in this tuple is what gets serialized
+HASHERS = (CrcAdlerHasher, CrcMixHasher, Blake2bHasher)
+HASHER_NAMES = tuple(cls.name for cls in HASHERS)
+
+def make_hasher(name: str, seed: int = 0) -> Hasher:
+    if name not in HASHER_NAMES:
+        raise ValueError(f"Unknown hasher {name!r}, expected one of {', '.join(HASHER_NAMES)}")
+    return HASHERS[HASHER_NAMES.index(name)](seed)
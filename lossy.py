@@ -2,15 +2,41 @@ import sys
 import math
 import collections
 import time
+import argparse
+
+import numpy as np
+
+from parsing import iter_query_bytes, to_text
+from evaluation import lookup, rank_heavy
+from memory import INT_BYTES, REF_BYTES, SMALL_DICT_BYTES, SMALL_LIST_BYTES
+from sketch_io import pack_header, unpack_header, pack_entries, unpack_entries, write_atomic, read_file
+
+LC_MAGIC = b"LCS1"
 
 class LossyCounting:
+    # Fixed attribute set: no per-instance __dict__
+    __slots__ = ("epsilon", "n", "width", "current_bucket", "counts", "_due", "_arrivals",
+                 "prunes", "prune_visits", "prune_tracked", "prune_seconds", "_key_bytes")
+
     def __init__(self, epsilon):
         self.epsilon = epsilon
         self.n = 0 
         self.counts = {}  
-        self.bucket_id = {} 
         self.current_bucket = 1
         self.width = math.ceil(1 / epsilon)
+        # Deltas are not stored per item. Items that entered in the same bucket share a delta,
+        # so the pruning index keeps them in groups: due[count + delta][delta] -> [items].
+        # Only items filed under the bucket that just ended are visited by _prune.
+        self._due = {}
+        # Items inserted in the current bucket (delta = current_bucket - 1, due at its end)
+        self._arrivals = []
+        # Pruning work, for the benchmarks: prune calls, items visited, items tracked, time spent
+        self.prunes = 0
+        self.prune_visits = 0
+        self.prune_tracked = 0
+        self.prune_seconds = 0.0
+        # Size of the tracked keys, kept up to date as they enter and leave (see nbytes)
+        self._key_bytes = 0
 
     def add(self, item):
         self.n += 1
@@ -18,18 +44,154 @@ class LossyCounting:
             self.counts[item] += 1
         else:
             self.counts[item] = 1
-            self.bucket_id[item] = self.current_bucket - 1
+            self._arrivals.append(item)
+            self._key_bytes += sys.getsizeof(item)
 
         if self.n % self.width == 0:
             self._prune()
             self.current_bucket += 1
 
     def _prune(self):
-        to_delete = [item for item in self.counts 
-        if self.counts[item] + self.bucket_id[item] <= self.current_bucket]
-        for item in to_delete:
-            del self.counts[item]
-            del self.bucket_id[item]
+        """
+        Drops every item with count + delta <= current_bucket, like a full scan would.
+        count + delta never decreases, so an item that has grown since it was filed
+        is moved to the bucket of its new value instead of being checked again before then.
+        """
+        # Once per bucket of 1/epsilon items, cheap enough to always time
+        start = time.perf_counter()
+        bucket = self.current_bucket
+        counts = self.counts
+        due = self._due
+        groups = due.pop(bucket, {})
+        if self._arrivals:
+            groups.setdefault(bucket - 1, []).extend(self._arrivals)
+            self._arrivals = []
+
+        self.prunes += 1
+        self.prune_tracked += len(counts)
+        for delta, items in groups.items():
+            self.prune_visits += len(items)
+            for item in items:
+                key = counts[item] + delta
+                if key <= bucket:
+                    del counts[item]
+                    self._key_bytes -= sys.getsizeof(item)
+                    continue
+                by_delta = due.get(key)
+                if by_delta is None:
+                    due[key] = {delta: [item]}
+                elif delta in by_delta:
+                    by_delta[delta].append(item)
+                else:
+                    by_delta[delta] = [item]
+        self.prune_seconds += time.perf_counter() - start
+
+    @property
+    def bucket_id(self):
+        """item -> delta, rebuilt from the pruning index (O(n), meant for merging and reporting)."""
+        deltas = dict.fromkeys(self._arrivals, self.current_bucket - 1)
+        for by_delta in self._due.values():
+            for delta, items in by_delta.items():
+                deltas.update(dict.fromkeys(items, delta))
+        return deltas
+
+    def _reindex(self, deltas, bucket):
+        """Rebuilds the pruning index from item -> delta; anything already overdue is filed under bucket."""
+        self._due = {}
+        self._arrivals = []
+        self._key_bytes = sum(map(sys.getsizeof, self.counts))
+        for item, delta in deltas.items():
+            key = max(self.counts[item] + delta, bucket)
+            self._due.setdefault(key, {}).setdefault(delta, []).append(item)
+
+    def estimate_many(self, items) -> np.ndarray:
+        """Counts of the items as an int64 array, 0 for untracked ones (an underestimate by at most epsilon * n)."""
+        return lookup(self.counts, items)
+
+    def heavy_hitters(self, threshold, items=None):
+        """Tracked items (or the given ones) with a count of at least threshold, largest first, as (items, counts)."""
+        items = list(self.counts) if items is None else list(items)
+        return rank_heavy(items, self.estimate_many(items), threshold)
+
+    def nbytes(self) -> int:
+        """
+        Memory of the counts dict plus the pruning index, in constant time: the key sizes are
+        tracked as items enter and leave, counts are one int each, and the index is one small
+        dict and list per due bucket plus one reference per item (its lists only reference
+        keys already counted in self.counts).
+        """
+        return (sys.getsizeof(self.counts) + self._key_bytes + len(self.counts) * INT_BYTES
+                + sys.getsizeof(self._arrivals) + sys.getsizeof(self._due)
+                + len(self._due) * (SMALL_DICT_BYTES + SMALL_LIST_BYTES) + len(self.counts) * REF_BYTES)
+
+    def get_stats(self) -> dict:
+        """Memory of the counts dict plus the pruning index; see nbytes."""
+        total_mem = self.nbytes()
+        return {
+            "epsilon": self.epsilon,
+            "tracked": len(self.counts),
+            "memory_kb": total_mem / 1024,
+            "memory_mb": total_mem / (1024 * 1024)
+        }
+
+    def merge(self, other):
+        """
+        Combines two summaries built with the same epsilon on different parts of a stream.
+        Counts and deltas are added; an item missing from one side may have been pruned
+        there with up to (that side's bucket - 1) occurrences, so that amount is added
+        to its delta. Pruning afterwards keeps the merged summary within epsilon * n.
+        """
+        if self.width != other.width:
+            raise ValueError(f"Cannot merge Lossy Counting with epsilon={other.epsilon} into epsilon={self.epsilon}")
+        self_missing = self.current_bucket - 1
+        other_missing = other.current_bucket - 1
+        deltas = self.bucket_id
+        other_deltas = other.bucket_id
+
+        for item in deltas:
+            if item not in other.counts:
+                deltas[item] += other_missing
+        for item, count in other.counts.items():
+            if item in self.counts:
+                self.counts[item] += count
+                deltas[item] += other_deltas[item]
+            else:
+                self.counts[item] = count
+                deltas[item] = other_deltas[item] + self_missing
+
+        self.n += other.n
+        # Prune as if the last completed bucket of the combined stream had just ended
+        completed = self.n // self.width
+        self.current_bucket = completed
+        self._reindex(deltas, completed)
+        self._prune()
+        self.current_bucket = completed + 1
+        return self
+
+    def to_bytes(self) -> bytes:
+        header = pack_header("dQQ", LC_MAGIC, self.epsilon, self.n, self.current_bucket)
+        deltas = self.bucket_id
+        return header + pack_entries(deltas.keys(),
+                                     [self.counts[item] for item in deltas],
+                                     deltas.values())
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        (epsilon, n, current_bucket), offset = unpack_header("dQQ", LC_MAGIC, data)
+        items, (counts, deltas), _ = unpack_entries(data, offset, 2)
+        lc = cls(epsilon)
+        lc.n = n
+        lc.current_bucket = current_bucket
+        lc.counts = dict(zip(items, counts))
+        lc._reindex(dict(zip(items, deltas)), current_bucket)
+        return lc
+
+    def save(self, path: str):
+        write_atomic(path, self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str):
+        return cls.from_bytes(read_file(path))
 
 def get_deep_size(obj):
     """Calculates memory size of a container and all the strings inside it."""
@@ -40,7 +202,7 @@ def get_deep_size(obj):
         size += sum(sys.getsizeof(i) for i in obj)
     return size
 
-def run_aol_local_test(filename):
+def run_aol_local_test(filename, workers=1):
     epsilon = 0.0005  
     lc = LossyCounting(epsilon)
     ground_truth = collections.Counter()
@@ -48,27 +210,38 @@ def run_aol_local_test(filename):
     print(f"Reading local file: {filename}...")
     
     try:
-        with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
-            next(f) 
-            
+        if workers > 1:
+            # Per-chunk summaries are built in a process pool and merged
+            from parallel import run_parallel
+            start_time = time.perf_counter()
+            _, estimators, _, _, _ = run_parallel(filename, ["gt", "lc"], workers, epsilon=epsilon)
+            end_time = time.perf_counter()
+            lc, ground_truth = estimators["lc"], estimators["gt"]
+        else:
             start_time = time.perf_counter()
-            for line in f:
-                columns = line.split('\t')
-                if len(columns) > 1:
-                    query = columns[1].lower().strip()
-                    if query:
-                        lc.add(query)
-                        ground_truth[query] += 1
+            for batch in iter_query_bytes(filename):
+                for query in batch:
+                    lc.add(query)
+                    ground_truth[query] += 1
             end_time = time.perf_counter()
 
-        mem_lc = get_deep_size(lc.counts) + get_deep_size(lc.bucket_id)
+        mem_lc = lc.get_stats()["memory_kb"] * 1024
+        # What the same summary costs as two parallel dicts: bucket_id had the same keys
+        # and growth history as counts, so the same table size, plus one int per item
+        mem_two_dicts = (get_deep_size(lc.counts) + sys.getsizeof(lc.counts)
+                         + sum(sys.getsizeof(delta) for delta in lc.bucket_id.values()))
         mem_gt = get_deep_size(ground_truth)
         
         print(f"ALGORITHM ANALYSIS: {filename}")
         print("-"*45)
         print(f"Total Queries Processed: {lc.n}")
         print(f"Processing Time:         {end_time - start_time:.4f} seconds")
+        print(f"Throughput:              {lc.n / (end_time - start_time):,.0f} queries/s")
         print(f"Lossy Counting Memory:   {mem_lc / 1024:.2f} KB")
+        print(f"Two-Dict Layout Memory:  {mem_two_dicts / 1024:.2f} KB")
+        if workers == 1:
+            # A full scan at every bucket boundary would visit prune_tracked items
+            print(f"Prune Visits:            {lc.prune_visits:,} of {lc.prune_tracked:,} tracked ({lc.prunes:,} prunes)")
         print(f"Ground Truth Memory:    {mem_gt / 1024:.2f} KB")
         print(f"Memory Saved:           {((mem_gt - mem_lc) / mem_gt) * 100:.2f}%")
         
@@ -79,10 +252,14 @@ def run_aol_local_test(filename):
         for item, actual_count in ground_truth.most_common(10):
             est_count = lc.counts.get(item, 0)
             status = "✅ OK" if est_count > 0 else "❌ PRUNED"
-            print(f"{item:<20} | {actual_count:<8} | {est_count:<8} | {status}")
+            print(f"{to_text(item):<20} | {actual_count:<8} | {est_count:<8} | {status}")
 
     except FileNotFoundError:
         print(f"Error: Could not find '{filename}'. Please ensure it is in this folder.")
 
 if __name__ == "__main__":
-    run_aol_local_test("user-ct-test-collection-01.txt")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Lossy Counting on a local AOL log file.")
+    parser.add_argument("filename", nargs="?", default="user-ct-test-collection-01.txt")
+    parser.add_argument("--workers", type=int, default=1, help="Ingest file chunks in N processes and merge")
+    args = parser.parse_args()
+    run_aol_local_test(args.filename, workers=args.workers)
\ No newline at end of file
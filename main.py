@@ -1,89 +1,196 @@
 import sys
 import time
+import argparse
+import itertools
 import collections
 
-def run_ground_truth(filename, max_lines=None):
-    counts = collections.Counter()
+import numpy as np
+
+from lossy import LossyCounting
+from misragries import MisraGries
+from cms import CountMinSketch
+from spacesaving import SpaceSaving
+from parsing import mapped, map_offset_batches, iter_query_bytes, to_text
+from checkpoint import Checkpoint
+from memory import INT_BYTES, MemorySampler
+from profiling import Profiler, print_profile
+from evaluation import calculate_metrics, lookup, rank_heavy, Reservoir, candidates, count_candidates
+from query_cache import QueryCache, feed_cache
+from sketch_io import pack_header, unpack_header, pack_entries, unpack_entries
+
+GT_MAGIC = b"GTC1"
+
+class GroundTruth(collections.Counter):
+    """Exact counter with the same add() interface as the sketches."""
+
+    # Keys already sized by nbytes() and their total size
+    _sized = 0
+    _key_bytes = 0
+
+    def add(self, item):
+        self[item] += 1
+
+    def add_many(self, items):
+        # Counter counts an iterable in C
+        self.update(items)
+
+    def estimate_many(self, items) -> np.ndarray:
+        return lookup(self, items)
+
+    def heavy_hitters(self, threshold, items=None):
+        """Items (all, or the given ones) with a count of at least threshold, largest first, as (items, counts)."""
+        items = list(self) if items is None else list(items)
+        return rank_heavy(items, self.estimate_many(items), threshold)
+
+    def nbytes(self) -> int:
+        """
+        Table plus keys plus counts, without walking every entry.
+        Keys are only ever added and a dict keeps insertion order, so just the keys added
+        since the last call are sized (the islice skips the rest in C).
+        """
+        if len(self) < self._sized:
+            # Something was deleted after all, size everything again
+            self._sized = self._key_bytes = 0
+        if len(self) > self._sized:
+            self._key_bytes += sum(map(sys.getsizeof, itertools.islice(self, self._sized, None)))
+            self._sized = len(self)
+        return sys.getsizeof(self) + self._key_bytes + len(self) * INT_BYTES
+
+    def merge(self, other):
+        self.update(other)
+        return self
+
+    def to_bytes(self) -> bytes:
+        return pack_header("", GT_MAGIC) + pack_entries(self.keys(), self.values())
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        _, offset = unpack_header("", GT_MAGIC, data)
+        keys, (counts,), _ = unpack_entries(data, offset, 1)
+        return cls(dict(zip(keys, counts)))
+
+# Registry of estimators the single-pass pipeline knows how to build.
+# Each factory takes epsilon so the sketches stay comparable (k = 1/eps for MG).
+ESTIMATORS = {
+    "gt": lambda eps: GroundTruth(),
+    "mg": lambda eps: MisraGries(int(1 / eps)),
+    "lc": lambda eps: LossyCounting(eps),
+    "ss": lambda eps: SpaceSaving(int(1 / eps)),
+    "cms": lambda eps: CountMinSketch(width=10000, depth=5),
+    "cmscu": lambda eps: CountMinSketch(width=10000, depth=5, policy="conservative"),
+    "cmscmm": lambda eps: CountMinSketch(width=10000, depth=5, policy="count-mean-min"),
+    "cmstop": lambda eps: CountMinSketch(width=10000, depth=5, top_k=100),
+    "cmscutop": lambda eps: CountMinSketch(width=10000, depth=5, top_k=100, policy="conservative"),
+    "cmscmmtop": lambda eps: CountMinSketch(width=10000, depth=5, top_k=100, policy="count-mean-min"),
+}
+
+# Count-Min Sketch policies compared side by side in the report
+CMS_POLICIES = {"cms": "standard", "cmscu": "conservative", "cmscmm": "count-mean-min"}
+
+def build_estimators(names, epsilon=0.0005):
+    return {name: ESTIMATORS[name](epsilon) for name in names}
+
+def _add_in_steps(estimator, batch, name, profiler):
+    """CountMinSketch.add_many on a sampled batch, its steps timed apart for the profiler."""
+    t0 = time.perf_counter()
+    items = [item.lower().strip() for item in batch]
+    t1 = time.perf_counter()
+    grouped = collections.Counter(items)
+    keys = list(grouped)
+    t2 = time.perf_counter()
+    hashes = estimator.hasher.pairs(keys)
+    t3 = time.perf_counter()
+    estimator.add_many(keys, list(grouped.values()), hashes=hashes)
+    t4 = time.perf_counter()
+    for step, seconds in (("normalize", t1 - t0), ("group", t2 - t1), ("hash", t3 - t2), ("update", t4 - t3)):
+        profiler.sampled[f"{step}:{name}"] += seconds
+
+def feed_estimators(batches, estimators, sampler=None, profiler=None):
+    """
+    Fans every batch of normalized queries out to all estimators.
+    Each estimator is fed a whole batch at a time so its update time can be
+    measured separately without a perf_counter call per item.
+    A memory.MemorySampler, if given, is sampled once per batch (as parse time).
+    A profiling.Profiler, if given, gets the batch sizes, the input and update times, the
+    estimators' work counters, and every few batches the hash/update split of the sketches.
+
+    Returns: (Total Processed, {name: update seconds}, parse seconds)
+    """
+    timings = {name: 0.0 for name in estimators}
     total = 0
     start = time.perf_counter()
-    with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
-        next(f)
-        for i,line in enumerate(f):
-            if max_lines and i >= max_lines:
-                break
-
-            parts = line.split('\t')
-            if len(parts) > 1:
-                query = parts[1].lower().strip()
-                if query and query not in ['-', '', '""', "''"]:
-                    counts[query] += 1
-                    total += 1
-    duration = time.perf_counter() - start
+    for batch in batches:
+        total += len(batch)
+        in_steps = profiler.batch(len(batch)) if profiler else False
+        for name, estimator in estimators.items():
+            t0 = time.perf_counter()
+            if in_steps and hasattr(estimator, "hasher"):
+                _add_in_steps(estimator, batch, name, profiler)
+            elif hasattr(estimator, "add_many"):
+                # Vectorized sketches take the whole batch at once
+                estimator.add_many(batch)
+            else:
+                add = estimator.add
+                for query in batch:
+                    add(query)
+            timings[name] += time.perf_counter() - t0
+        if sampler:
+            sampler.sample()
+    parse_time = time.perf_counter() - start - sum(timings.values())
+    if profiler:
+        profiler.add("input", parse_time)
+        for name, seconds in timings.items():
+            profiler.add(f"update:{name}", seconds)
+        profiler.count_events(estimators)
+    return total, timings, parse_time
+
+def run_pipeline(filename, estimators, max_lines=None, batch_size=10000, checkpoint=None, resume=False,
+                 sampler=None, profiler=None):
+    """
+    Parses the memory-mapped file once and feeds all estimators; see feed_estimators
+    for the return value. Queries are lowercased bytes, decode them with parsing.to_text.
+
+    With a checkpoint.Checkpoint the estimators are saved as the file is read (saving counts
+    as parse time). resume=True first replaces the estimators in the dict with the saved
+    ones and reads on from the saved offset; max_lines still counts from the top of the file.
+    Resuming gives the same estimators as an uninterrupted run, except for conservative update
+    after a checkpoint written at a max_lines stop (see checkpoint.Checkpoint).
+    """
+    if checkpoint is None:
+        return feed_estimators(iter_query_bytes(filename, max_lines, batch_size, profiler), estimators,
+                               sampler, profiler)
+
+    restored = 0
+    with mapped(filename) as buf:
+        start = buf.find(b'\n') + 1 or len(buf)
+        if resume and checkpoint.exists():
+            start, lines_done, restored = checkpoint.restore(filename, estimators)
+            if max_lines:
+                # Nothing left when the limit was already reached (0 would mean no limit)
+                max_lines -= lines_done
+                start = start if max_lines > 0 else len(buf)
+        batches = map_offset_batches(buf, start, len(buf), max_lines, batch_size, profiler=profiler)
+        total, timings, parse_time = feed_estimators(checkpoint.track(filename, batches, estimators), estimators,
+                                                     sampler, profiler)
+    return restored + total, timings, parse_time
+
+def run_ground_truth(filename, max_lines=None):
+    counts = GroundTruth()
+    total, timings, _ = run_pipeline(filename, {"gt": counts}, max_lines)
     # Return: (Total Processed, The actual Counter object, Duration)
-    return total, counts, duration
+    return total, counts, timings["gt"]
 
 def run_loss_counting_test(filename, epsilon=0.0005, max_lines=None):
-    from lossy import LossyCounting 
     lc = LossyCounting(epsilon)
-    start = time.perf_counter()
-    with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
-        next(f)
-        for i,line in enumerate(f):
-            if max_lines and i >= max_lines:
-                break
-
-            parts = line.split('\t')
-            if len(parts) > 1:
-                query = parts[1].lower().strip()
-                if query and query not in ['-', '', '""', "''"]:
-                    lc.add(query)
-    duration = time.perf_counter() - start
+    _, timings, _ = run_pipeline(filename, {"lc": lc}, max_lines)
     # Return: (The counts dictionary inside LC, Duration)
-    return lc.counts, duration
+    return lc.counts, timings["lc"]
 
 def run_misra_gries_test(filename, k=2000, max_lines=None):
-    candidates = {}
-    start = time.perf_counter()
-    with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
-        next(f)
-        for i,line in enumerate(f):
-            if max_lines and i >= max_lines:
-                break
-
-            parts = line.split('\t')
-            if len(parts) > 1:
-                query = parts[1].lower().strip()
-                if not query or query in ['-', '', '""', "''"]: continue
-                
-                if query in candidates:
-                    candidates[query] += 1
-                elif len(candidates) < k - 1:
-                    candidates[query] = 1
-                else:
-                    for key in list(candidates.keys()):
-                        candidates[key] -= 1
-                        if candidates[key] == 0:
-                            del candidates[key]
-    duration = time.perf_counter() - start
+    mg = MisraGries(k)
+    _, timings, _ = run_pipeline(filename, {"mg": mg}, max_lines)
     # Return: (The candidate dictionary, Duration)
-    return candidates, duration
-
-def get_deep_size(obj, seen=None):
-    """
-    Recursively finds size of objects, including contents of containers.
-    By default, it uses a set to track seen object ids to avoid double-counting.
-    """
-    if seen is None: seen = set()
-    obj_id = id(obj)
-    if obj_id in seen: return 0
-    seen.add(obj_id)
-    
-    size = sys.getsizeof(obj)
-    if isinstance(obj, dict):
-        size += sum(get_deep_size(k, seen) + get_deep_size(v, seen) for k, v in obj.items())
-    elif isinstance(obj, (list, tuple, set, collections.Counter)):
-        size += sum(get_deep_size(i, seen) for i in obj)
-    return size
+    return mg.counts, timings["mg"]
 
 import csv
 import os
@@ -92,105 +199,256 @@ def save_metrics_to_csv(
     csv_file,
     limit,
     mg_time, mg_mem, mg_ae, mg_re,
-    lc_time, lc_mem, lc_ae, lc_re
+    lc_time, lc_mem, lc_ae, lc_re,
+    ss_time, ss_mem, ss_ae, ss_re
 ):
     """
     Appends experiment metrics to a CSV file.
-    Creates the file with header if it doesn't exist.
+    Creates the file with header if it doesn't exist, and upgrades files written
+    before the Space-Saving columns existed (old rows get empty values).
     """
+    header = [
+        "limit",
+        "mg_runtime", "mg_memory_kb", "mg_avg_abs_error", "mg_avg_rel_error",
+        "lc_runtime", "lc_memory_kb", "lc_avg_abs_error", "lc_avg_rel_error",
+        "ss_runtime", "ss_memory_kb", "ss_avg_abs_error", "ss_avg_rel_error"
+    ]
 
     file_exists = os.path.isfile(csv_file)
+    if file_exists:
+        with open(csv_file, "r", newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        if rows and rows[0] != header:
+            old_rows = [dict(zip(rows[0], row)) for row in rows[1:]]
+            with open(csv_file, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerows([row.get(column, "") for column in header] for row in old_rows)
 
     with open(csv_file, "a", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
 
         if not file_exists:
-            writer.writerow([
-                "limit",
-                "mg_runtime", "mg_memory_kb", "mg_avg_abs_error", "mg_avg_rel_error",
-                "lc_runtime", "lc_memory_kb", "lc_avg_abs_error", "lc_avg_rel_error"
-            ])
+            writer.writerow(header)
 
         writer.writerow([
             limit,
             round(mg_time, 4), round(mg_mem, 2), round(mg_ae, 2), round(mg_re * 100, 2),
-            round(lc_time, 4), round(lc_mem, 2), round(lc_ae, 2), round(lc_re * 100, 2)
+            round(lc_time, 4), round(lc_mem, 2), round(lc_ae, 2), round(lc_re * 100, 2),
+            round(ss_time, 4), round(ss_mem, 2), round(ss_ae, 2), round(ss_re * 100, 2)
         ])
 
 
-def calculate_metrics(gt_data, algorithm_data, total_n, threshold_ratio=0.001):
-    threshold = total_n * threshold_ratio
-    abs_errors = []
-    rel_errors = []
-    
-    # Only evaluate items that are actually "Heavy"
-    heavy_hitters = {k: v for k, v in gt_data.items() if v >= threshold}
-    
-    for query, actual in heavy_hitters.items():
-        est = algorithm_data.get(query, 0)
-        error = abs(actual - est)
-        abs_errors.append(error)
-        rel_errors.append(error / actual)
-        
-    avg_abs = sum(abs_errors) / len(abs_errors) if abs_errors else 0
-    avg_rel = sum(rel_errors) / len(rel_errors) if rel_errors else 0
-    
-    return avg_abs, avg_rel, len(heavy_hitters)
+def save_cms_metrics_to_csv(csv_file, limit, cms_time, cms_mem, cms_ae, cms_re):
+    """
+    Appends Count-Min Sketch metrics to the CSV read by graph.ipynb.
+    Creates the file with header if it doesn't exist.
+    """
+
+    file_exists = os.path.isfile(csv_file)
+
+    with open(csv_file, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+
+        if not file_exists:
+            writer.writerow(["limit", "cms_runtime", "cms_memory", "cms_ae", "cms_re"])
+
+        writer.writerow([
+            limit, round(cms_time, 4), round(cms_mem, 2), round(cms_ae, 2), round(cms_re * 100, 2)
+        ])
+
+
+def save_cms_policy_metrics_to_csv(csv_file, limit, policy_rows):
+    """
+    Appends one row per Count-Min policy: (policy, time, memory KB, avg abs error, avg rel error).
+    Creates the file with header if it doesn't exist.
+    """
+
+    file_exists = os.path.isfile(csv_file)
+
+    with open(csv_file, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+
+        if not file_exists:
+            writer.writerow(["limit", "policy", "runtime", "memory", "ae", "re"])
+
+        for policy, runtime, mem, ae, re in policy_rows:
+            writer.writerow([limit, policy, round(runtime, 4), round(mem, 2), round(ae, 2), round(re * 100, 2)])
+
 
 def main():
     filename = "clean.txt"
     eps = 0.0005
-    limit = sys.argv[1] if len(sys.argv) > 1 else None
-    if limit:
-        limit = int(limit)
-    k_val = int(1/eps)
+    parser = argparse.ArgumentParser(description="Compare heavy hitter algorithms on the AOL dataset.")
+    parser.add_argument("limit", nargs="?", type=int, default=None, help="Only read the first N lines")
+    parser.add_argument("--workers", type=int, default=1, help="Ingest file chunks in N processes and merge")
+    parser.add_argument("--checkpoint", metavar="PATH", default=None,
+                        help="Save every estimator and the read position to PATH while reading")
+    parser.add_argument("--checkpoint-every", type=int, default=1_000_000, metavar="LINES",
+                        help="Lines between checkpoints (saved at the next block edge)")
+    parser.add_argument("--checkpoint-seconds", type=float, default=None, metavar="T",
+                        help="Also save a checkpoint after T seconds")
+    parser.add_argument("--resume", action="store_true", help="Continue from the --checkpoint file if it exists")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also record the peak of Python allocations with tracemalloc (slows ingestion)")
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="Time the ingestion phases and write the profile to PATH as JSON")
+    parser.add_argument("--cache", metavar="PATH", default=None,
+                        help="Read a query cache from filter_query.py instead of parsing the log (limit then counts queries)")
+    parser.add_argument("--bounded-eval", action="store_true",
+                        help="Count exactly only the queries the estimators report plus a sample, in a second "
+                             "pass, instead of keeping every distinct query")
+    parser.add_argument("--sample", type=int, default=10000,
+                        help="Stream positions sampled for --bounded-eval (single process only)")
+    args = parser.parse_args()
+    limit = args.limit
+    if args.bounded_eval and (args.cache or args.checkpoint):
+        parser.error("--bounded-eval reads the log a second time, without --cache or --checkpoint")
+    if args.profile and args.workers > 1:
+        parser.error("--profile times a single process, without --workers")
+    if args.cache and (args.workers > 1 or args.checkpoint):
+        parser.error("--cache is read in one pass, without --workers or --checkpoint")
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint")
+    if args.workers > 1 and args.checkpoint:
+        parser.error("--checkpoint follows a single reader, it can't be combined with --workers")
 
     print(f"--- Processing AOL Dataset (2006) ---")
     
-    # 1. Ground Truth
-    total_n, gt_data, gt_time = run_ground_truth(filename, max_lines=limit)
-    
-    # 2. Misra-Gries
-    mg_data, mg_time = run_misra_gries_test(filename, k=k_val, max_lines=limit)
-    
-    # 3. Lossy Counting
-    lc_data, lc_time = run_loss_counting_test(filename, epsilon=eps, max_lines=limit)
+    # Single pass: parse each line once, feed Ground Truth, Misra-Gries, Lossy Counting, Space-Saving
+    # and CMS under each update/query policy
+    # With --bounded-eval the exact counts come from a second pass over the candidates
+    names = ([] if args.bounded_eval else ["gt"]) + ["mg", "lc", "ss"] + list(CMS_POLICIES)
+    memory_report = None
+    sample = None
+    profiler = Profiler().start() if args.profile else None
+    if args.cache:
+        estimators = build_estimators(names, epsilon=eps)
+        with QueryCache(args.cache) as cache:
+            total_n, timings, parse_time = feed_cache(cache, estimators, max_queries=limit, profiler=profiler)
+    elif args.workers > 1:
+        from parallel import run_parallel
+        total_n, estimators, timings, parse_time, wall_time = run_parallel(
+            filename, names, args.workers, epsilon=eps, max_lines=limit)
+        print(f"Ingested with {args.workers} workers in {wall_time:.4f} seconds (times below are summed over workers)")
+    else:
+        estimators = build_estimators(names, epsilon=eps)
+        if args.bounded_eval:
+            # Fed like a sketch, taken out again before the report
+            estimators["sample"] = sample = Reservoir(args.sample)
+        checkpoint = None
+        if args.checkpoint:
+            checkpoint = Checkpoint(args.checkpoint, args.checkpoint_every, args.checkpoint_seconds)
+        with MemorySampler(trace=args.trace_memory) as sampler:
+            total_n, timings, parse_time = run_pipeline(filename, estimators, max_lines=limit,
+                                                        checkpoint=checkpoint, resume=args.resume,
+                                                        sampler=sampler, profiler=profiler)
+        memory_report = sampler.report
+    if profiler:
+        profiler.save(args.profile)
+    if args.bounded_eval:
+        estimators.pop("sample", None)
+        timings.pop("sample", None)
+        wanted = candidates(estimators, sample.items if sample else ())
+        start = time.perf_counter()
+        estimators["gt"] = count_candidates(iter_query_bytes(filename, limit), wanted, GroundTruth())
+        timings["gt"] = time.perf_counter() - start
+        print(f"Bounded evaluation: exact counts of {len(wanted):,} candidate queries "
+              f"({len(set(sample.items)) if sample else 0:,} of them sampled), second pass {timings['gt']:.4f} seconds")
+
+    gt_data, cms = estimators["gt"], estimators["cms"]
+    mg_data, mg_time = estimators["mg"].counts, timings["mg"]
+    lc_data, lc_time = estimators["lc"].counts, timings["lc"]
+    ss_data, ss_time = estimators["ss"].counts, timings["ss"]
+    gt_time, cms_time = timings["gt"], timings["cms"]
 
-    mg_mem = get_deep_size(mg_data) / 1024     # KB
-    lc_mem = get_deep_size(lc_data) / 1024     # KB
+    gt_mem = gt_data.nbytes() / 1024                       # KB
+    mg_mem = estimators["mg"].get_stats()["memory_kb"]     # KB, candidates plus their index
+    lc_mem = estimators["lc"].get_stats()["memory_kb"]     # KB, counts plus pruning index
+    ss_mem = estimators["ss"].get_stats()["memory_kb"]     # KB, counters plus Stream-Summary buckets
+    cms_mem = cms.get_stats()["memory_kb"]
 
-    mg_avg_absolute_error, mg_avg_relative_error, mg_heavy_hitters_count = calculate_metrics(gt_data, mg_data, total_n)
-    lc_avg_absolute_error, lc_avg_relative_error, lc_heavy_hitters_count = calculate_metrics(gt_data, lc_data, total_n)
+    # The estimators are passed themselves, so each is asked for just the heavy hitters in one batch
+    mg_avg_absolute_error, mg_avg_relative_error, mg_heavy_hitters_count = calculate_metrics(
+        gt_data, estimators["mg"], total_n)
+    lc_avg_absolute_error, lc_avg_relative_error, lc_heavy_hitters_count = calculate_metrics(
+        gt_data, estimators["lc"], total_n)
+    ss_avg_absolute_error, ss_avg_relative_error, _ = calculate_metrics(gt_data, estimators["ss"], total_n)
+    cms_avg_absolute_error, cms_avg_relative_error, _ = calculate_metrics(gt_data, cms, total_n)
+
+    # Same table size for every policy, so the errors compare accuracy per byte
+    policy_rows = []
+    for name, policy in CMS_POLICIES.items():
+        sketch = estimators[name]
+        ae, re, _ = calculate_metrics(gt_data, sketch, total_n)
+        policy_rows.append((policy, timings[name], sketch.get_stats()["memory_kb"], ae, re))
 
     # OUTPUT REPORT
-    print("\n" + "="*85)
-    print(f"{'RANK':<5} | {'QUERY':<20} | {'ACTUAL':<10} | {'MG EST':<10} | {'LC EST':<10}")
-    print("-" * 85)
+    print("\n" + "="*111)
+    print(f"{'RANK':<5} | {'QUERY':<20} | {'ACTUAL':<10} | {'MG EST':<10} | {'LC EST':<10} | {'SS EST':<10} | {'CMS EST':<10}")
+    print("-" * 111)
 
     top_10 = gt_data.most_common(10)
     for rank, (query, actual) in enumerate(top_10, 1):
         mg_est = mg_data.get(query, 0)
         lc_est = lc_data.get(query, 0)
+        ss_est = ss_data.get(query, 0)
+        cms_est = cms.estimate(query)
         
         # In Misra-Gries, if an item is present, its count is an underestimate
         # In Lossy Counting, if it's present, its count is an underestimate
-        print(f"{rank:<5} | {query[:20]:<20} | {actual:<10} | {mg_est:<10} | {lc_est:<10}")
+        # In Space-Saving, if it's present, its count is an overestimate
+        # Count-Min Sketch never underestimates
+        print(f"{rank:<5} | {to_text(query)[:20]:<20} | {actual:<10} | {mg_est:<10} | {lc_est:<10} | {ss_est:<10} | {cms_est:<10}")
 
-    print("\n" + "="*85)
+    print("\n" + "="*111)
     print("ALGORITHM STATISTICS:")
-    print(f"Ground Truth RAM:   {get_deep_size(gt_data)/1024/1024:,.2f} MB")
-    print(f"Misra-Gries RAM:    {get_deep_size(mg_data)/1024/1024:,.2f} MB")
-    print(f"Lossy Counting RAM: {get_deep_size(lc_data)/1024/1024:,.2f} MB")
-    print(f"Space Reduction:    {100 * (1 - get_deep_size(lc_data)/get_deep_size(gt_data)):.2f}%")
+    print(f"Ground Truth RAM:   {gt_mem/1024:,.2f} MB")
+    print(f"Misra-Gries RAM:    {mg_mem/1024:,.2f} MB")
+    print(f"Lossy Counting RAM: {lc_mem/1024:,.2f} MB")
+    print(f"Space-Saving RAM:   {ss_mem/1024:,.2f} MB")
+    print(f"Count-Min RAM:      {cms_mem/1024:,.2f} MB")
+    if args.bounded_eval:
+        # Only the candidates were counted, so there is no full table to compare with
+        print("Space Reduction:    n/a (ground truth RAM above is the candidate counts)")
+    else:
+        print(f"Space Reduction:    {100 * (1 - lc_mem / gt_mem):.2f}%")
+    if memory_report:
+        print(f"Process RSS:        {memory_report['peak_rss_mb']:,.2f} MB peak, "
+              f"{memory_report['rss_growth_mb']:,.2f} MB grown during ingestion")
+        if "traced_peak_mb" in memory_report:
+            print(f"Traced Python peak: {memory_report['traced_peak_mb']:,.2f} MB")
 
-    print("\n Processing Times:")
+    print("\n Processing Times (update only, file parsed once):")
+    print(f"Parsing:        {parse_time:.4f} seconds")
     print(f"Ground Truth:   {gt_time:.4f} seconds")
     print(f"Misra-Gries:    {mg_time:.4f} seconds")
     print(f"Lossy Counting: {lc_time:.4f} seconds")
+    print(f"Space-Saving:   {ss_time:.4f} seconds")
+    print(f"Count-Min:      {cms_time:.4f} seconds")
+    if profiler:
+        print_profile(profiler.report())
+        print(f"Profile → {args.profile}")
     
     print("\n Average Errors for Heavy Hitters (Threshold: {:.4f}%)".format(0.001))
     print(f"Misra-Gries:    Avg Absolute Error: {mg_avg_absolute_error:.2f}, Avg Relative Error: {mg_avg_relative_error*100:.2f}%")
     print(f"Lossy Counting: Avg Absolute Error: {lc_avg_absolute_error:.2f}, Avg Relative Error: {lc_avg_relative_error*100:.2f}%")
+    print(f"Space-Saving:   Avg Absolute Error: {ss_avg_absolute_error:.2f}, Avg Relative Error: {ss_avg_relative_error*100:.2f}%")
+    print(f"Count-Min:      Avg Absolute Error: {cms_avg_absolute_error:.2f}, Avg Relative Error: {cms_avg_relative_error*100:.2f}%")
+    if sample:
+        # Heavy and light queries, in proportion to how often they occur
+        sampled = {q: gt_data[q] for q in set(sample.items)}
+        print(f"\n Average Errors over {len(sampled):,} Sampled Queries")
+        for label, name in (("Misra-Gries", "mg"), ("Lossy Counting", "lc"), ("Space-Saving", "ss"),
+                            ("Count-Min", "cms")):
+            ae, re, _ = calculate_metrics(sampled, estimators[name], total_n, threshold_ratio=0)
+            print(f"{label + ':':<16}Avg Absolute Error: {ae:.2f}, Avg Relative Error: {re*100:.2f}%")
+
+    print("\n Count-Min Sketch Policies (same width and depth):")
+    print(f"{'POLICY':<15} | {'TIME (s)':<10} | {'RAM (KB)':<10} | {'AVG ABS ERR':<12} | {'AVG REL ERR':<12}")
+    print("-" * 70)
+    for policy, runtime, mem, ae, re in policy_rows:
+        print(f"{policy:<15} | {runtime:<10.4f} | {mem:<10.2f} | {ae:<12.2f} | {f'{re*100:.2f}%':<12}")
 
     save_metrics_to_csv(
     csv_file="metrics.csv",
@@ -202,7 +460,24 @@ def main():
     lc_time=lc_time,
     lc_mem=lc_mem,
     lc_ae=lc_avg_absolute_error,
-    lc_re=lc_avg_relative_error
+    lc_re=lc_avg_relative_error,
+    ss_time=ss_time,
+    ss_mem=ss_mem,
+    ss_ae=ss_avg_absolute_error,
+    ss_re=ss_avg_relative_error
+)
+    save_cms_metrics_to_csv(
+    csv_file="cms.csv",
+    limit=limit if limit else total_n,
+    cms_time=cms_time,
+    cms_mem=cms_mem,
+    cms_ae=cms_avg_absolute_error,
+    cms_re=cms_avg_relative_error
+)
+    save_cms_policy_metrics_to_csv(
+    csv_file="cms_policies.csv",
+    limit=limit if limit else total_n,
+    policy_rows=policy_rows
 )
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+import os
+import sys
+import resource
+import tracemalloc
+
+# Sizes used by the nbytes() models of the estimators (CPython, 64-bit).
+# A count or error below 2 ** 30 is one 28-byte int object, which is what get_deep_size
+# charged for every value.
+INT_BYTES = sys.getsizeof(1)
+FLOAT_BYTES = sys.getsizeof(1.0)
+# One (estimate, item) tuple on the Count-Min top-k heap
+PAIR_BYTES = sys.getsizeof((0, b""))
+# One reference held in a list or as a dict value
+REF_BYTES = 8
+# One entry of a growing dict, averaged over its resize steps (24-byte entry plus index and slack)
+DICT_ENTRY_BYTES = 32
+# The small dicts and lists the pruning indexes and Stream-Summary buckets are made of
+SMALL_DICT_BYTES = sys.getsizeof({0: None})
+SMALL_LIST_BYTES = sys.getsizeof([None])
+
+def _page_size() -> int:
+    try:
+        return os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError):
+        return 4096
+
+PAGE_SIZE = _page_size()
+
+def rss_bytes() -> int:
+    """Current resident set size. Falls back to the peak where /proc is not available."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return peak_rss_bytes()
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemorySampler:
+    """
+    Samples process memory while estimators are fed (see main.feed_estimators): the RSS
+    every `every` batches and, with trace=True, the peak of Python allocations from
+    tracemalloc. RSS sampling is one small read per sample; tracemalloc slows down
+    allocation-heavy code noticeably, so it is off unless asked for.
+    """
+
+    def __init__(self, every: int = 10, trace: bool = False):
+        self.every = every
+        self.trace = trace
+        self.batches = 0
+        self.start_rss = 0
+        self.peak_rss = 0
+
+    def start(self):
+        self.batches = 0
+        self.start_rss = self.peak_rss = rss_bytes()
+        if self.trace:
+            tracemalloc.start()
+        return self
+
+    def sample(self):
+        self.batches += 1
+        if self.batches % self.every == 0:
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+
+    def stop(self) -> dict:
+        self.peak_rss = max(self.peak_rss, rss_bytes())
+        report = {
+            "start_rss_mb": self.start_rss / (1024 * 1024),
+            "peak_rss_mb": self.peak_rss / (1024 * 1024),
+            "rss_growth_mb": (self.peak_rss - self.start_rss) / (1024 * 1024),
+        }
+        if self.trace:
+            report["traced_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        return report
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.report = self.stop()
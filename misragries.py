@@ -1,45 +1,229 @@
-def misra_gries(k: int, stream: list) -> dict:
+import os
+import sys
+import argparse
+from collections.abc import Callable, Iterator
+
+import numpy as np
+
+from parsing import iter_query_bytes, to_text
+from evaluation import lookup, rank_heavy
+from memory import INT_BYTES, REF_BYTES, SMALL_LIST_BYTES
+from sketch_io import pack_header, unpack_header, pack_entries, unpack_entries, write_atomic, read_file
+
+MG_MAGIC = b"MGS1"
+
+class MisraGries:
+    """
+    Streaming Misra-Gries summary with the same add/counts interface as LossyCounting.
+    Keeps at most k - 1 candidates; every stored count is an underestimate.
+
+    "Decrement every candidate" is done by raising a global offset: each candidate stores
+    count + offset, so its count drops without touching it. Only candidates whose stored
+    value equals the new offset reach zero, and an index keyed by stored value finds them.
+    """
+    __slots__ = ("k", "n", "_raw", "_offset", "_due", "_arrivals", "_key_bytes",
+                 "decrements", "decrement_drops")
+
+    def __init__(self, k: int):
+        if k < 2:
+            raise ValueError("k must be at least 2")
+        self.k = k
+        self.n = 0
+        # item -> count + offset
+        self._raw = {}
+        # Number of decrements applied to every candidate so far
+        self._offset = 0
+        # Stored value -> candidates filed under it when they were inserted or last checked.
+        # Increments don't refile; a candidate that grew is refiled when its old value comes up.
+        self._due = {}
+        # Candidates inserted since the last decrement, all stored as offset + 1
+        self._arrivals = []
+        # Size of the candidate keys, kept up to date as they enter and leave (see nbytes)
+        self._key_bytes = 0
+        # Decrement work, for profiling: decrements and candidates they evicted
+        self.decrements = 0
+        self.decrement_drops = 0
+
+    @property
+    def counts(self):
+        offset = self._offset
+        return {item: raw - offset for item, raw in self._raw.items()}
+
+    def add(self, item):
+        self.n += 1
+        candidates = self._raw
+        if item in candidates:
+            candidates[item] += 1
+        elif len(candidates) < self.k - 1:
+            candidates[item] = self._offset + 1
+            self._arrivals.append(item)
+            self._key_bytes += sys.getsizeof(item)
+        else:
+            self._decrement()
+
+    def _decrement(self):
+        """Decreases every count by one and evicts the candidates that reach zero."""
+        self._offset += 1
+        self.decrements += 1
+        offset = self._offset
+        filed = self._due.pop(offset, [])
+        filed.extend(self._arrivals)
+        self._arrivals = []
+        candidates = self._raw
+        due = self._due
+        for item in filed:
+            value = candidates[item]
+            if value == offset:
+                del candidates[item]
+                self._key_bytes -= sys.getsizeof(item)
+                self.decrement_drops += 1
+            elif value in due:
+                due[value].append(item)
+            else:
+                due[value] = [item]
+
+    def _rebuild(self, counts):
+        """Resets the offset and index from item -> count."""
+        self._raw = dict(counts)
+        self._offset = 0
+        self._due = {}
+        self._arrivals = []
+        self._key_bytes = sum(map(sys.getsizeof, self._raw))
+        for item, count in self._raw.items():
+            self._due.setdefault(count, []).append(item)
+
+    def estimate_many(self, items) -> np.ndarray:
+        """Counts of the items as an int64 array, 0 for non-candidates; read off the stored values and offset."""
+        return lookup(self._raw, items, self._offset) - self._offset
+
+    def heavy_hitters(self, threshold, items=None):
+        """Candidates (or the given items) with a count of at least threshold, largest first, as (items, counts)."""
+        items = list(self._raw) if items is None else list(items)
+        return rank_heavy(items, self.estimate_many(items), threshold)
+
+    def nbytes(self) -> int:
+        """
+        Memory of the candidates plus their index, in constant time: key sizes are tracked
+        as candidates enter and leave, counts are one int each, and the index is one small
+        list per stored value plus one reference per candidate.
+        """
+        return (sys.getsizeof(self._raw) + self._key_bytes + len(self._raw) * INT_BYTES
+                + sys.getsizeof(self._arrivals) + sys.getsizeof(self._due)
+                + len(self._due) * SMALL_LIST_BYTES + len(self._raw) * REF_BYTES)
+
+    def get_stats(self) -> dict:
+        """Memory of the candidates plus their index; see nbytes."""
+        total_mem = self.nbytes()
+        return {
+            "k": self.k,
+            "tracked": len(self._raw),
+            "memory_kb": total_mem / 1024,
+            "memory_mb": total_mem / (1024 * 1024)
+        }
+
+    def merge(self, other: "MisraGries"):
+        """
+        Mergeable-summaries merge (Agarwal et al.): add the counters, then if more than
+        k - 1 remain, subtract the k-th largest count from all and drop the non-positive ones.
+        The merged summary keeps the n/k error guarantee for the combined stream.
+        """
+        if self.k != other.k:
+            raise ValueError(f"Cannot merge Misra-Gries summaries with k={other.k} and k={self.k}")
+        candidates = self.counts
+        for key, count in other.counts.items():
+            candidates[key] = candidates.get(key, 0) + count
+        self.n += other.n
+
+        if len(candidates) > self.k - 1:
+            kth = sorted(candidates.values(), reverse=True)[self.k - 1]
+            candidates = {key: count - kth for key, count in candidates.items() if count > kth}
+        self._rebuild(candidates)
+        return self
+
+    def to_bytes(self) -> bytes:
+        header = pack_header("IQ", MG_MAGIC, self.k, self.n)
+        counts = self.counts
+        return header + pack_entries(counts.keys(), counts.values())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "MisraGries":
+        (k, n), offset = unpack_header("IQ", MG_MAGIC, data)
+        keys, (counts,), _ = unpack_entries(data, offset, 1)
+        mg = cls(k)
+        mg.n = n
+        mg._rebuild(zip(keys, counts))
+        return mg
+
+    def save(self, path: str):
+        write_atomic(path, self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "MisraGries":
+        return cls.from_bytes(read_file(path))
+
+
+def open_stream(source) -> Callable[[], Iterator]:
+    """
+    Turns a re-readable source into a factory returning a fresh iterator on every call:
+      - a file path: normalized queries from the AOL log, read lazily batch by batch
+      - a callable: used as is, e.g. lambda: iter_query_bytes(...) flattened
+      - a list, tuple or other re-iterable container
+    One-shot iterators and generators are rejected because they can't be read twice.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return lambda: (query for batch in iter_query_bytes(source) for query in batch)
+    if callable(source):
+        return source
+    if isinstance(source, Iterator):
+        raise TypeError("stream is a one-shot iterator; pass a file path or a function that reopens it")
+    return lambda: iter(source)
+
+
+def misra_gries(k: int, stream) -> dict:
     """
     Implements the Misra-Gries algorithm to find all elements in a stream
     that occur more than n/k times.
 
+    Both passes stream the source, so memory stays at the k - 1 candidates
+    no matter how long the stream is.
+
     Parameters:
     k (int): The threshold divisor.
-    stream (list): The input stream of elements.
+    stream (str | callable | list): A log file path, a function returning a new
+        iterator over the stream, or a re-iterable container. See open_stream.
 
     Returns:
-    dict: A dictionary with elements as keys and their estimated counts as values.
+    dict: A dictionary with elements as keys and their exact counts as values.
     """
     if k < 2:
         raise ValueError("k must be at least 2")
+    reopen = open_stream(stream)
 
-    # Step 1: Initialize an empty dictionary to hold candidate elements and their counts
-    candidates = {}
-
-    # Step 2: Process each element in the stream
-    for element in stream:
-        if element in candidates:
-            candidates[element] += 1
-        elif len(candidates) < k - 1:
-            candidates[element] = 1
-        else:
-            # Decrease count of all candidates
-            for key in list(candidates.keys()):
-                candidates[key] -= 1
-                if candidates[key] == 0:
-                    del candidates[key]
+    # Step 1 & 2: Process each element in the stream, keeping at most k - 1 candidates
+    mg = MisraGries(k)
+    for element in reopen():
+        mg.add(element)
+    candidates = mg.counts
 
-    # Step 3: Verify the counts of the candidates
+    # Step 3: Verify the counts of the candidates, counting nothing else
     final_counts = {key: 0 for key in candidates.keys()}
-    for element in stream:
+    for element in reopen():
         if element in final_counts:
             final_counts[element] += 1
 
     # Step 4: Filter out elements that occur more than n/k times
-    n = len(stream)
+    # n comes from the first pass, the stream is never materialized to take its length
+    n = mg.n
     result = {key: count for key, count in final_counts.items() if count > n / k}
 
     return result
 
 if __name__ == "__main__":
-    pass
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Exact n/k heavy hitters of an AOL log in two streaming passes.")
+    parser.add_argument("filename", nargs="?", default="clean.txt")
+    parser.add_argument("--k", type=int, default=2000, help="Report queries occurring more than n/k times")
+    args = parser.parse_args()
+
+    heavy = misra_gries(args.k, args.filename)
+    for rank, (query, count) in enumerate(sorted(heavy.items(), key=lambda x: x[1], reverse=True), 1):
+        print(f"{rank:<5} | {to_text(query)[:50]:<50} | {count}")
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from parsing import chunk_offsets, iter_chunk_queries
+from main import build_estimators, feed_estimators
+
+def _ingest_chunk(filename, start, end, names, epsilon, batch_size):
+    """
+    Worker: builds fresh estimators over one byte range of the log.
+    Sketches are sent back in their compact binary form instead of being pickled.
+    """
+    estimators = build_estimators(names, epsilon)
+    batches = iter_chunk_queries(filename, start, end, batch_size=batch_size)
+    total, timings, parse_time = feed_estimators(batches, estimators)
+    payloads = {name: estimator.to_bytes() for name, estimator in estimators.items()}
+    return total, timings, parse_time, payloads
+
+def run_parallel(filename, names, workers, epsilon=0.0005, max_lines=None, batch_size=10000):
+    """
+    Splits the log on newline-aligned byte offsets, builds one set of partial sketches
+    per chunk in a process pool and merges them into a single set of estimators.
+
+    Returns: (Total Processed, {name: estimator}, {name: update seconds summed over workers},
+              parse seconds summed over workers, wall seconds)
+    """
+    start = time.perf_counter()
+    chunks = chunk_offsets(filename, workers, max_lines=max_lines)
+
+    estimators = build_estimators(names, epsilon)
+    timings = {name: 0.0 for name in names}
+    parse_time = 0.0
+    total = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_ingest_chunk, filename, a, b, names, epsilon, batch_size)
+                   for a, b in chunks]
+        # Merge in chunk order so the result does not depend on which worker finishes first
+        for future in futures:
+            chunk_total, chunk_timings, chunk_parse, payloads = future.result()
+            total += chunk_total
+            parse_time += chunk_parse
+            for name, payload in payloads.items():
+                estimator = estimators[name]
+                estimator.merge(type(estimator).from_bytes(payload))
+                timings[name] += chunk_timings[name]
+
+    return total, estimators, timings, parse_time, time.perf_counter() - start
+
+def scaling_report(filename, names, max_workers, epsilon=0.0005, max_lines=None):
+    """Runs the same ingestion with 1, 2, 4, ... max_workers processes and prints throughput."""
+    counts = []
+    n = 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    counts.append(max_workers)
+
+    print(f"Scaling report: {filename} | estimators: {', '.join(names)}")
+    print(f"{'WORKERS':<8} | {'WALL (s)':<10} | {'QUERIES/S':<14} | {'SPEEDUP':<8}")
+    print("-" * 50)
+    baseline = None
+    for workers in counts:
+        total, _, _, _, wall = run_parallel(filename, names, workers, epsilon=epsilon, max_lines=max_lines)
+        if baseline is None:
+            baseline = wall
+        print(f"{workers:<8} | {wall:<10.4f} | {total / wall:<14,.0f} | {baseline / wall:<8.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of parallel ingestion as the worker count grows.")
+    parser.add_argument("filename", nargs="?", default="clean.txt")
+    parser.add_argument("--limit", type=int, default=None, help="Only read the first N lines")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Largest worker count to test")
+    parser.add_argument("--estimators", default="gt,mg,lc,cms", help="Comma separated names from main.ESTIMATORS")
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        print("Error: --workers must be at least 1")
+        sys.exit(1)
+    scaling_report(args.filename, args.estimators.split(","), args.workers, max_lines=args.limit)
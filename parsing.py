@@ -0,0 +1,233 @@
+import os
+import re
+import mmap
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Query fields that carry no search text
+INVALID_QUERIES = ('-', '', '""', "''")
+INVALID_QUERY_BYTES = tuple(q.encode() for q in INVALID_QUERIES)
+
+# Bytes lowercased and split at a time by map_batches
+BLOCK_SIZE = 1 << 24
+
+def normalize_batches(lines, max_lines=None, batch_size=10000):
+    """
+    Turns raw AOL log lines into lists of normalized (lowercased, stripped) queries.
+    max_lines counts raw lines, including the ones that are skipped as invalid.
+    """
+    batch = []
+    for i, line in enumerate(lines):
+        if max_lines and i >= max_lines:
+            break
+
+        parts = line.split('\t')
+        if len(parts) > 1:
+            query = parts[1].lower().strip()
+            if query and query not in INVALID_QUERIES:
+                batch.append(query)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+def iter_query_batches(filename, max_lines=None, batch_size=10000):
+    """
+    Reads the whole log once as text, skipping the header line.
+    Gives str queries with full Unicode lowercasing; the estimators use iter_query_bytes.
+    """
+    with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
+        next(f)
+        yield from normalize_batches(f, max_lines, batch_size)
+
+def data_start(filename) -> int:
+    """Byte offset of the first line after the header."""
+    with open(filename, 'rb') as f:
+        f.readline()
+        return f.tell()
+
+def line_offset(filename, n_lines, start=0, block_size=BLOCK_SIZE) -> int:
+    """Byte offset just past the first n_lines lines that begin at start."""
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        pos = start
+        while n_lines > 0:
+            block = f.read(block_size)
+            if not block:
+                break
+            found = block.count(b'\n')
+            if found < n_lines:
+                n_lines -= found
+                pos += len(block)
+                continue
+            # The wanted newline is inside this block, walk to it
+            cut = -1
+            for _ in range(n_lines):
+                cut = block.index(b'\n', cut + 1)
+            return pos + cut + 1
+        return pos
+
+def chunk_offsets(filename, n_chunks, max_lines=None):
+    """
+    Splits the data lines of the log into n_chunks byte ranges that start and end on
+    line boundaries. max_lines limits the ranges to the same lines the serial readers see.
+    Returns a list of (start, end) offsets; ranges can be empty on tiny files.
+    """
+    start = data_start(filename)
+    end = line_offset(filename, max_lines, start) if max_lines is not None else os.path.getsize(filename)
+    step = max((end - start) // n_chunks, 1)
+
+    bounds = [start]
+    with open(filename, 'rb') as f:
+        for i in range(1, n_chunks):
+            pos = start + i * step
+            if pos >= end:
+                break
+            # Move to the start of the next line (pos - 1 keeps pos if it already is one)
+            f.seek(pos - 1)
+            f.readline()
+            bounds.append(max(min(f.tell(), end), bounds[-1]))
+    bounds.append(end)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+@contextmanager
+def mapped(filename):
+    """Read-only memory map of the file (mmap refuses empty files, so those give b'')."""
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+# Second tab-separated field of every line, matched over a whole block at once
+_QUERY_FIELD = re.compile(rb'^[^\t\n]*\t([^\t\n]*)', re.MULTILINE)
+
+def _blocks(buf, start, end, max_lines=None, block_size=BLOCK_SIZE, profiler=None):
+    """
+    Lowercased, newline-aligned blocks of buf[start:end], stopping after max_lines lines.
+    bytes.lower() folds ASCII case only, one call per block.
+    Yields (block, offset just past the block).
+    A profiling.Profiler gets the copy out of buf as "read" and the lowercasing as "normalize".
+    """
+    lines_left = max_lines
+    pos = start
+    while pos < end:
+        stop = min(pos + block_size, end)
+        if stop < end:
+            cut = buf.rfind(b'\n', pos, stop)
+            # A single line longer than a block: extend the block to the end of that line
+            stop = cut + 1 if cut >= 0 else (buf.find(b'\n', stop, end) + 1 or end)
+        if profiler:
+            t0 = time.perf_counter()
+            block = buf[pos:stop]
+            t1 = time.perf_counter()
+            block = block.lower()
+            profiler.add("read", t1 - t0)
+            profiler.add("normalize", time.perf_counter() - t1)
+        else:
+            block = buf[pos:stop].lower()
+        first, pos = pos, stop
+
+        if lines_left:
+            # Split off everything after the last allowed line without a Python-level loop
+            rest = block.split(b'\n', lines_left)
+            if len(rest) > lines_left:
+                block = block[:len(block) - len(rest[-1])]
+                pos = end
+            lines_left -= block.count(b'\n') + (not block.endswith(b'\n'))
+        yield block, first + len(block)
+
+def _query_fields(block, invalid, profiler=None):
+    """The stripped, valid query fields of a lowercased block; timed as "parse" if profiled."""
+    t0 = profiler and time.perf_counter()
+    queries = [q for q in map(bytes.strip, _QUERY_FIELD.findall(block)) if q not in invalid]
+    if profiler:
+        profiler.add("parse", time.perf_counter() - t0)
+    return queries
+
+def map_batches(buf, start, end, max_lines=None, batch_size=10000, block_size=BLOCK_SIZE, profiler=None):
+    """
+    Yields lists of normalized queries as bytes from buf[start:end] (an mmap or bytes).
+
+    The buffer is cut into newline-aligned blocks. Every block is lowercased with one
+    bytes.lower() call, which folds ASCII case only, and its query fields are pulled out
+    with a single regex scan. Nothing is decoded to str, and the resulting bytes can go
+    straight into zlib or be used as dict keys.
+    A profiling.Profiler, if given, gets the read, normalize and parse time of every block.
+    """
+    invalid = set(INVALID_QUERY_BYTES)
+    for block, _ in _blocks(buf, start, end, max_lines, block_size, profiler):
+        queries = _query_fields(block, invalid, profiler)
+        for i in range(0, len(queries), batch_size):
+            yield queries[i:i + batch_size]
+
+def map_offset_batches(buf, start, end, max_lines=None, batch_size=10000, block_size=BLOCK_SIZE,
+                       profiler=None):
+    """
+    map_batches that also reports how far it got, for checkpointing: yields
+    (queries, offset, lines) where offset is the byte position just past the block the
+    batch came from and lines the raw lines in that block. Both are only set on the last
+    batch of a block (None and 0 on the others), since a read can only resume at a block edge.
+    A block without valid queries still yields an empty batch to carry its offset.
+    """
+    invalid = set(INVALID_QUERY_BYTES)
+    for block, offset in _blocks(buf, start, end, max_lines, block_size, profiler):
+        queries = _query_fields(block, invalid, profiler)
+        lines = block.count(b'\n') + (not block.endswith(b'\n'))
+        last = max(len(queries) - 1, 0) // batch_size * batch_size
+        for i in range(0, last, batch_size):
+            yield queries[i:i + batch_size], None, 0
+        yield queries[last:], offset, lines
+
+# Query and QueryTime fields; lines without a well-formed timestamp don't match
+_TIMED_FIELDS = re.compile(rb'^[^\t\n]*\t([^\t\n]*)\t(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)[\t\n]',
+                           re.MULTILINE)
+
+def map_timed_batches(buf, start, end, max_lines=None, batch_size=10000, block_size=BLOCK_SIZE,
+                      profiler=None):
+    """
+    Like map_batches, but yields (queries, times) where times is an int64 array of the
+    QueryTime field in seconds since the epoch (the log's local time, taken as UTC).
+    The timestamps of a whole block are converted by NumPy in one call.
+    """
+    invalid = set(INVALID_QUERY_BYTES)
+    for block, _ in _blocks(buf, start, end, max_lines, block_size, profiler):
+        t0 = profiler and time.perf_counter()
+        if not block.endswith(b'\n'):
+            # The last line of the file may have no newline
+            block += b'\n'
+        pairs = [(q, t) for q, t in ((q.strip(), t) for q, t in _TIMED_FIELDS.findall(block))
+                 if q not in invalid]
+        if not pairs:
+            continue
+        queries, stamps = zip(*pairs)
+        times = np.array(stamps, dtype='datetime64[s]').astype(np.int64)
+        if profiler:
+            profiler.add("parse", time.perf_counter() - t0)
+        for i in range(0, len(queries), batch_size):
+            yield list(queries[i:i + batch_size]), times[i:i + batch_size]
+
+def iter_query_bytes(filename, max_lines=None, batch_size=10000, profiler=None):
+    """Memory-mapped version of iter_query_batches: skips the header and yields bytes queries."""
+    with mapped(filename) as buf:
+        start = buf.find(b'\n') + 1 or len(buf)
+        yield from map_batches(buf, start, len(buf), max_lines, batch_size, profiler=profiler)
+
+def iter_timed_queries(filename, max_lines=None, batch_size=10000, profiler=None):
+    """(queries, times) batches of the whole log, header skipped; see map_timed_batches."""
+    with mapped(filename) as buf:
+        start = buf.find(b'\n') + 1 or len(buf)
+        yield from map_timed_batches(buf, start, len(buf), max_lines, batch_size, profiler=profiler)
+
+def iter_chunk_queries(filename, start, end, batch_size=10000):
+    """Bytes queries from one [start, end) range made by chunk_offsets."""
+    with mapped(filename) as buf:
+        yield from map_batches(buf, start, min(end, len(buf)), batch_size=batch_size)
+
+def to_text(query) -> str:
+    """Decodes a bytes query for display; only done for the few items that get reported."""
+    return query.decode('utf-8', errors='ignore') if isinstance(query, bytes) else query
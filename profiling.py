@@ -0,0 +1,102 @@
+import json
+import time
+from collections import defaultdict
+
+class Profiler:
+    """
+    Where the time of an ingestion run goes. The loops that take a profiler (the parsing
+    map_*_batches readers, main.feed_estimators, query_cache.feed_cache and the CLIs built on
+    them) report into it:
+        phases   seconds per phase over the whole run: read (copying a block out of the
+                 map, page faults included), normalize (lowercasing), parse (query field
+                 scan), input (all of the above plus checkpoints, as seen by the feeding
+                 loop) and update:<name> per estimator
+        sampled  every `every`-th batch a sketch with a hasher is fed in steps, timing
+                 normalize:<name>, group:<name>, hash:<name> and update:<name> apart
+        rates    items/s over every `interval` seconds of the run
+        events   the work counters the estimators keep (prunes, decrements, evictions, ...)
+    Reads and batches are timed whole, so a run without a profiler only pays one `if` per
+    block and batch, and a profiled one a few perf_counter calls per batch.
+    """
+    # Work counters kept by the estimators themselves
+    EVENTS = ("prunes", "prune_visits", "prune_seconds", "decrements", "decrement_drops", "evictions",
+              "rescales")
+
+    def __init__(self, every: int = 16, interval: float = 1.0):
+        self.every = every
+        self.interval = interval
+        self.phases = defaultdict(float)
+        self.sampled = defaultdict(float)
+        self.rates = []
+        self.events = {}
+        self.batches = 0
+        self.sampled_batches = 0
+        self.items = 0
+        self._start = self._mark = None
+        self._mark_items = 0
+
+    def start(self):
+        self._start = self._mark = time.perf_counter()
+        return self
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] += seconds
+
+    def batch(self, n: int) -> bool:
+        """Counts a batch of n items; True if this batch should be timed in steps."""
+        if self._start is None:
+            self.start()
+        self.batches += 1
+        self.items += n
+        now = time.perf_counter()
+        if now - self._mark >= self.interval:
+            self.rates.append((now - self._start, (self.items - self._mark_items) / (now - self._mark)))
+            self._mark, self._mark_items = now, self.items
+        if self.batches % self.every == 0:
+            self.sampled_batches += 1
+            return True
+        return False
+
+    def count_events(self, estimators: dict):
+        """Takes the current work counters of the estimators."""
+        for name, estimator in estimators.items():
+            found = {event: getattr(estimator, event) for event in self.EVENTS if hasattr(estimator, event)}
+            if found:
+                self.events[name] = found
+
+    def report(self) -> dict:
+        elapsed = time.perf_counter() - self._start if self._start is not None else 0.0
+        return {
+            "seconds": elapsed,
+            "items": self.items,
+            "batches": self.batches,
+            "items_per_s": self.items / elapsed if elapsed else None,
+            "phases": dict(self.phases),
+            "sampled_batches": self.sampled_batches,
+            "sampled": dict(self.sampled),
+            "rates": [{"at_s": round(at, 3), "items_per_s": rate} for at, rate in self.rates],
+            "events": self.events,
+        }
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def print_profile(report: dict):
+    """Human-readable version of Profiler.report()."""
+    print(f"\n Profile: {report['items']:,} items in {report['batches']:,} batches, "
+          f"{report['items_per_s'] or 0:,.0f} items/s")
+    total = report["seconds"] or 1e-9
+    for phase, seconds in sorted(report["phases"].items(), key=lambda x: -x[1]):
+        print(f"  {phase:<24} {seconds:>10.4f} s  {100 * seconds / total:>6.2f}%")
+    if report["sampled"]:
+        print(f"  Steps over {report['sampled_batches']:,} sampled batches:")
+        for phase, seconds in report["sampled"].items():
+            print(f"    {phase:<22} {seconds:>10.4f} s")
+    rates = [row["items_per_s"] for row in report["rates"]]
+    if rates:
+        print(f"  Items/s per interval: min {min(rates):,.0f}, max {max(rates):,.0f}, last {rates[-1]:,.0f}")
+    for name, events in report["events"].items():
+        print(f"  {name}: " + ", ".join(f"{event} {value:,.4g}" if isinstance(value, float)
+                                        else f"{event} {value:,}" for event, value in events.items()))
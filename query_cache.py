@@ -0,0 +1,163 @@
+import mmap
+import time
+import collections
+from array import array
+
+import numpy as np
+
+from parsing import iter_query_bytes
+from hashers import HASHER_NAMES, make_hasher
+from sketch_io import pack_header, unpack_header, pack_entries, unpack_entries, write_atomic
+
+QC_MAGIC = b"QCH1"
+
+# How the cached queries were normalized; a cache written under other rules is refused.
+# Same rules as parsing.map_batches: second field, ASCII lowercase, strip, drop the invalid fields.
+NORMALIZATION = b"field=2;lower=ascii;strip;drop=-,'',\"\",''"
+
+_HEADER = "BQIQH"
+
+def _pad(size: int) -> bytes:
+    """Zero bytes up to the next multiple of 8, so the arrays after it are aligned."""
+    return b"\0" * (-size % 8)
+
+def build_cache(batches, path: str, hasher: str = None, seed: int = 0):
+    """
+    Writes the normalized queries from batches (lists of bytes, as from parsing.iter_query_bytes)
+    as a query cache:
+        header (magic, hasher index + 1 or 0, seed, distinct queries, stream length, rules)
+        dictionary: every distinct query once, in order of first appearance, with its count
+        ID stream: one uint32 per query, the position of the query in the dictionary
+        hashes (optional): the (h1, h2) pair of every dictionary entry under the given hasher
+    Returns (stream length, distinct queries).
+    """
+    ids_of = {}
+    ids = array("I")
+    for batch in batches:
+        # setdefault hands out the next ID to a query it has not seen yet
+        ids.extend([ids_of.setdefault(query, len(ids_of)) for query in batch])
+    keys = list(ids_of)
+    counts = np.bincount(np.frombuffer(ids, dtype=np.uint32), minlength=len(keys)) if ids else []
+
+    hasher_id = HASHER_NAMES.index(hasher) + 1 if hasher else 0
+    parts = [pack_header(_HEADER, QC_MAGIC, hasher_id, seed, len(keys), len(ids), len(NORMALIZATION)),
+             NORMALIZATION, pack_entries(keys, counts)]
+    size = sum(map(len, parts))
+    # Little-endian like the rest of the file, whatever the host
+    parts += [_pad(size), np.frombuffer(ids, dtype=np.uint32).astype("<u4").tobytes()]
+    if hasher:
+        size += len(parts[-2]) + len(parts[-1])
+        parts += [_pad(size), make_hasher(hasher, seed).pairs(keys).astype("<u8").tobytes()]
+    write_atomic(path, b"".join(parts))
+    return len(ids), len(keys)
+
+def cache_log(filename: str, path: str, hasher: str = None, seed: int = 0, max_lines=None):
+    """Query cache of a log file, normalized exactly like the estimators' own parser."""
+    return build_cache(iter_query_bytes(filename, max_lines), path, hasher, seed)
+
+
+class QueryCache:
+    """
+    Read side of a query cache. The file is memory-mapped: keys and counts are loaded,
+    ids and hashes are NumPy views straight into the map, nothing else is read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = self._map
+        (hasher_id, seed, n_keys, n_ids, rules_size), offset = unpack_header(_HEADER, QC_MAGIC, data)
+        rules = data[offset:offset + rules_size]
+        if rules != NORMALIZATION:
+            raise ValueError(f"{path} was built with normalization {rules!r}, rebuild it with filter_query.py")
+        self.keys, (counts,), offset = unpack_entries(data, offset + rules_size, 1)
+        self.counts = np.array(counts, dtype=np.int64)
+        offset += len(_pad(offset))
+        self.ids = np.frombuffer(data, dtype="<u4", count=n_ids, offset=offset)
+        offset += 4 * n_ids
+        offset += len(_pad(offset))
+        self.hasher = HASHER_NAMES[hasher_id - 1] if hasher_id else None
+        self.seed = seed
+        self.hashes = (np.frombuffer(data, dtype="<u8", count=2 * n_keys, offset=offset).reshape(n_keys, 2)
+                       if hasher_id else None)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def close(self):
+        # The arrays are views into the map, so drop them first
+        self.ids = self.hashes = None
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def batches(self, max_queries=None, batch_size=10000):
+        """Lists of bytes queries in stream order, like parsing.iter_query_bytes."""
+        keys = self.keys
+        ids = self.ids[:max_queries] if max_queries else self.ids
+        for i in range(0, len(ids), batch_size):
+            yield [keys[j] for j in ids[i:i + batch_size].tolist()]
+
+    def frequencies(self, max_queries=None) -> np.ndarray:
+        """Count of every dictionary entry, over the first max_queries queries if given."""
+        if not max_queries or max_queries >= len(self.ids):
+            return self.counts
+        return np.bincount(self.ids[:max_queries], minlength=len(self.keys))
+
+
+def feed_cache(cache: QueryCache, estimators: dict, max_queries=None, batch_size=10000, profiler=None):
+    """
+    Cache version of main.feed_estimators, same return value and profiler reports.
+
+    Estimators that only need counts get them without going through the stream: an exact
+    Counter is updated once from the dictionary counts, and sketches with add_many take
+    every distinct query once with its count (using the cached hashes when they match the
+    sketch's hasher and seed). As with any single batch, a conservative-update sketch can end
+    up slightly different from one fed in stream order. Order-dependent summaries
+    (Misra-Gries, Lossy Counting, Space-Saving) replay the ID stream; turning IDs back into
+    keys is what counts as parse time here.
+    """
+    timings = {name: 0.0 for name in estimators}
+    ordered = {}
+    start = time.perf_counter()
+    freq = cache.frequencies(max_queries)
+    present = np.flatnonzero(freq)
+    keys = [cache.keys[i] for i in present.tolist()]
+    counts = freq[present]
+    for name, estimator in estimators.items():
+        t0 = time.perf_counter()
+        if isinstance(estimator, collections.Counter):
+            estimator.update(dict(zip(keys, counts.tolist())))
+        elif hasattr(estimator, "add_many"):
+            hasher = getattr(estimator, "hasher", None)
+            if cache.hashes is not None and hasher and (hasher.name, hasher.seed) == (cache.hasher, cache.seed):
+                estimator.add_many(keys, counts, hashes=cache.hashes[present])
+            else:
+                estimator.add_many(keys, counts)
+        else:
+            ordered[name] = estimator
+        timings[name] += time.perf_counter() - t0
+
+    total = int(counts.sum())
+    if ordered:
+        for batch in cache.batches(max_queries, batch_size):
+            if profiler:
+                profiler.batch(len(batch))
+            for name, estimator in ordered.items():
+                t0 = time.perf_counter()
+                add = estimator.add
+                for query in batch:
+                    add(query)
+                timings[name] += time.perf_counter() - t0
+    parse_time = time.perf_counter() - start - sum(timings.values())
+    if profiler:
+        profiler.add("input", parse_time)
+        for name, seconds in timings.items():
+            profiler.add(f"update:{name}", seconds)
+        profiler.count_events(estimators)
+    return total, timings, parse_time
@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+
+from cms import CountMinSketch, POLICIES
+from main import feed_estimators
+from checkpoint import Checkpoint
+from parsing import map_batches, to_text
+from profiling import Profiler
+
+# Bytes read from the log per step; the event loop serves queries between steps
+READ_SIZE = 1 << 20
+
+class LogFollower:
+    """
+    Reads a growing log like tail -F: only complete lines are handed out, a partial last
+    line is kept until its newline arrives, and a rotated (replaced or truncated) file is
+    reopened from the start. offset is the byte position just past the last complete line.
+    from_end skips what the log already holds, up to its last complete line; a log that
+    doesn't exist yet is read from the start once it appears.
+    """
+
+    def __init__(self, path: str, offset: int = None, from_end: bool = False):
+        self.path = path
+        self.offset = offset
+        self._from_end = from_end and os.path.exists(path)
+        self._file = None
+        self._inode = None
+        self._pending = b""
+
+    @staticmethod
+    def _line_end(f) -> int:
+        """Offset just past the last newline in f (0 if there is none), read backwards from the end."""
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(end - READ_SIZE, 0)
+            f.seek(start)
+            cut = f.read(end - start).rfind(b"\n")
+            if cut >= 0:
+                return start + cut + 1
+            end = start
+        return 0
+
+    def _open(self) -> bool:
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return False
+        if self._file:
+            self._file.close()
+        self._file = f
+        self._inode = os.fstat(f.fileno()).st_ino
+        self._pending = b""
+        if self.offset is None and self._from_end:
+            # A line the writer is still appending is read whole once its newline arrives
+            self.offset = self._line_end(f) or None
+        if self.offset is None:
+            # First open: skip the AnonID header if there is one (same check as filter_query.py)
+            first = f.readline()
+            header = first.endswith(b"\n") and first[:6].lower() == b"anonid"
+            self.offset = len(first) if header else 0
+        f.seek(self.offset)
+        return True
+
+    def _rotated(self) -> bool:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return stat.st_ino != self._inode or stat.st_size < self.offset
+
+    def read(self) -> bytes:
+        """Newly completed lines (possibly b""); never blocks."""
+        if self._file is None and not self._open():
+            return b""
+        if self._rotated():
+            # Read the new file from the start, skipping its header like a first open
+            self.offset = None
+            self._from_end = False
+            if not self._open():
+                return b""
+        chunk = self._pending + self._file.read(READ_SIZE)
+        cut = chunk.rfind(b"\n") + 1
+        self._pending = chunk[cut:]
+        self.offset += cut
+        return chunk[:cut]
+
+
+class SketchService:
+    """
+    Keeps a Count-Min Sketch (with top-k) up to date from a followed log and answers
+    queries over a local socket while it does. Ingestion and queries share one event
+    loop, so the sketch is never read halfway through an update and needs no lock.
+
+    Protocol: one command per line, one JSON line back.
+        EST <query>   -> {"query": ..., "estimate": n}
+        TOP [n]       -> {"top": [[query, estimate], ...]}
+        STATS         -> total queries, lines, offset and the sketch's get_stats()
+        PROFILE       -> profiling.Profiler report of the ingestion so far (with --profile)
+    """
+
+    def __init__(self, path: str, cms: CountMinSketch, offset: int = None, lines: int = 0, total: int = 0,
+                 poll: float = 0.5, checkpoint: Checkpoint = None, checkpoint_seconds: float = 60,
+                 profiler: Profiler = None, from_end: bool = False):
+        self.follower = LogFollower(path, offset, from_end)
+        self.cms = cms
+        self.lines = lines
+        self.total = total
+        self.poll = poll
+        self.checkpoint = checkpoint
+        self.checkpoint_seconds = checkpoint_seconds
+        self.profiler = profiler
+
+    def ingest(self) -> int:
+        """Feeds whatever complete lines have arrived; returns the number of bytes read."""
+        data = self.follower.read()
+        if data:
+            batches = map_batches(data, 0, len(data), profiler=self.profiler)
+            self.total += feed_estimators(batches, {"cms": self.cms}, profiler=self.profiler)[0]
+            self.lines += data.count(b"\n")
+        return len(data)
+
+    async def follow(self):
+        saved_at = time.monotonic()
+        while True:
+            if not self.ingest():
+                await asyncio.sleep(self.poll)
+            else:
+                # Let waiting queries in between reads
+                await asyncio.sleep(0)
+            if self.checkpoint and time.monotonic() - saved_at >= self.checkpoint_seconds:
+                self.save()
+                saved_at = time.monotonic()
+
+    def save(self):
+        if self.follower.offset is not None:
+            self.checkpoint.save(self.follower.path, {"cms": self.cms}, self.follower.offset,
+                                 self.lines, self.total)
+
+    def answer(self, line: str) -> dict:
+        command, _, argument = line.strip().partition(" ")
+        command = command.upper()
+        if command == "EST" and argument:
+            return {"query": argument, "estimate": self.cms.estimate(argument.encode("utf-8"))}
+        if command == "TOP":
+            n = int(argument) if argument.strip().isdigit() else 10
+            return {"top": [[to_text(query), estimate] for query, estimate in self.cms.top_k_items(n)]}
+        if command == "STATS":
+            return {"total": self.total, "lines": self.lines, "offset": self.follower.offset,
+                    **self.cms.get_stats()}
+        if command == "PROFILE":
+            if self.profiler is None:
+                return {"error": "Not profiling, start the service with --profile"}
+            return self.profiler.report()
+        return {"error": f"Unknown command {line.strip()!r}, expected EST <query>, TOP [n], STATS or PROFILE"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                reply = self.answer(line.decode("utf-8", errors="ignore"))
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def run(self, socket_path: str):
+        server = await asyncio.start_unix_server(self.handle, path=socket_path)
+        # A service manager stops us with SIGTERM; shut down like Ctrl-C so the checkpoint is written
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        print(f"Following {self.follower.path}, queries on {socket_path}")
+        try:
+            async with server:
+                await asyncio.gather(server.serve_forever(), self.follow())
+        finally:
+            if self.checkpoint:
+                self.save()
+
+
+async def ask(socket_path: str, command: str) -> dict:
+    """Sends one command to a running service and returns its reply."""
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    writer.write(command.encode("utf-8") + b"\n")
+    await writer.drain()
+    reply = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+    return reply
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Follow a growing AOL log and serve Count-Min estimates.")
+    parser.add_argument("filename", nargs="?", default="clean.txt")
+    parser.add_argument("--socket", default="heavyhitters.sock", help="Unix socket to answer queries on")
+    parser.add_argument("--ask", metavar="COMMAND", default=None,
+                        help="Send one command (EST <query>, TOP [n], STATS, PROFILE) to a running service and exit")
+    parser.add_argument("--from-end", action="store_true", help="Only count lines written from now on")
+    parser.add_argument("--poll", type=float, default=0.5, help="Seconds between checks for new lines")
+    parser.add_argument("--policy", choices=POLICIES, default="standard", help="Update and point query policy")
+    parser.add_argument("--checkpoint", metavar="PATH", default=None,
+                        help="Save the sketch and position to PATH periodically and on exit, and resume from it")
+    parser.add_argument("--checkpoint-seconds", type=float, default=60, metavar="T")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time the ingestion phases, reported by the PROFILE command")
+    args = parser.parse_args()
+
+    if args.ask:
+        print(json.dumps(asyncio.run(ask(args.socket, args.ask)), indent=2))
+        return
+
+    cms = CountMinSketch(width=10000, depth=5, top_k=100, policy=args.policy)
+    offset, lines, total = None, 0, 0
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+    if checkpoint and checkpoint.exists():
+        state = {"cms": cms}
+        try:
+            offset, lines, total = checkpoint.restore(args.filename, state)
+        except ValueError as e:
+            # The log was rotated or rewritten since the checkpoint (or it belongs to another log)
+            print(f"Error: {e}. Remove the checkpoint to start over from the beginning of the log.")
+            sys.exit(1)
+        cms = state["cms"]
+        print(f"Resuming at byte {offset:,} after {lines:,} lines")
+
+    service = SketchService(args.filename, cms, offset, lines, total, poll=args.poll,
+                            checkpoint=checkpoint, checkpoint_seconds=args.checkpoint_seconds,
+                            profiler=Profiler().start() if args.profile else None, from_end=args.from_end)
+    if os.path.exists(args.socket):
+        # Left behind by a previous run
+        os.unlink(args.socket)
+    try:
+        asyncio.run(service.run(args.socket))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print("\nStopped")
+
+
+if __name__ == "__main__":
+    main()
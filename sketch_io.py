@@ -0,0 +1,80 @@
+import os
+import struct
+
+import numpy as np
+
+# Compact binary layout shared by the counter-based sketches (Misra-Gries, Lossy Counting).
+# A block of n entries is stored column-wise:
+#   n (uint32) | key type (0 = str, 1 = bytes) | n key lengths (uint32) | utf-8 key bytes |
+#   one int64 column per value field
+# Column-wise arrays are converted with one NumPy call each instead of a struct call per
+# entry, which keeps save/load fast even with large summaries. Like the headers, every
+# field is little-endian whatever the host, so files move between machines.
+
+_COUNT = struct.Struct("<IB")
+_LENGTH = np.dtype("<u4")
+_VALUE = np.dtype("<i8")
+
+
+def pack_header(fmt: str, magic: bytes, *fields) -> bytes:
+    return struct.pack("<4s" + fmt, magic, *fields)
+
+
+def unpack_header(fmt: str, magic: bytes, data: bytes):
+    """Checks the magic bytes and returns (fields, offset of the payload)."""
+    header = struct.Struct("<4s" + fmt)
+    if len(data) < header.size:
+        raise ValueError("Truncated sketch data")
+    found, *fields = header.unpack_from(data)
+    if found != magic:
+        raise ValueError(f"Not a {magic.decode()} sketch (magic {found!r})")
+    return fields, header.size
+
+
+def pack_entries(keys, *columns) -> bytes:
+    # Queries from the bytes parser are stored as they are and come back as bytes
+    keys = list(keys)
+    as_bytes = bool(keys) and isinstance(keys[0], bytes)
+    encoded = keys if as_bytes else [key.encode("utf-8") for key in keys]
+    parts = [_COUNT.pack(len(encoded), as_bytes),
+             np.fromiter(map(len, encoded), dtype=_LENGTH, count=len(encoded)).tobytes(),
+             b"".join(encoded)]
+    for column in columns:
+        parts.append(np.fromiter(column, dtype=_VALUE, count=len(encoded)).tobytes())
+    return b"".join(parts)
+
+
+def unpack_entries(data: bytes, offset: int, n_columns: int):
+    """Returns (keys, [column, ...], new offset); the columns are lists of ints."""
+    n, as_bytes = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+
+    lengths = np.frombuffer(data, dtype=_LENGTH, count=n, offset=offset).tolist()
+    offset += 4 * n
+
+    keys = []
+    for length in lengths:
+        key = data[offset:offset + length]
+        keys.append(key if as_bytes else key.decode("utf-8"))
+        offset += length
+
+    columns = []
+    for _ in range(n_columns):
+        columns.append(np.frombuffer(data, dtype=_VALUE, count=n, offset=offset).tolist())
+        offset += 8 * n
+    return keys, columns, offset
+
+
+def write_atomic(path: str, data: bytes):
+    """Writes to a temporary file first so a crash never leaves a half-written sketch."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
@@ -0,0 +1,227 @@
+import sys
+
+import numpy as np
+
+from memory import INT_BYTES, DICT_ENTRY_BYTES, SMALL_DICT_BYTES
+from evaluation import rank_heavy
+from sketch_io import pack_header, unpack_header, pack_entries, unpack_entries, write_atomic, read_file
+
+SS_MAGIC = b"SSS1"
+
+class _Bucket:
+    """All monitored items with the same count, linked in increasing count order."""
+    __slots__ = ("count", "items", "prev", "next")
+
+    def __init__(self, count, prev=None, next=None):
+        self.count = count
+        # dict used as an insertion-ordered set, so the oldest item is evicted first
+        self.items = {}
+        self.prev = prev
+        self.next = next
+
+BUCKET_BYTES = sys.getsizeof(_Bucket(0))
+
+class SpaceSaving:
+    """
+    Space-Saving (Metwally et al.) on a Stream-Summary: k counters kept in buckets of equal
+    count, so incrementing an item and replacing the minimum are both O(1).
+    Same add/counts interface as LossyCounting. Counts are overestimates: for every
+    monitored item, counts[item] - errors[item] <= true count <= counts[item].
+    """
+    __slots__ = ("k", "n", "errors", "_bucket_of", "_min", "_key_bytes", "_buckets", "evictions")
+
+    def __init__(self, k: int):
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        self.k = k
+        self.n = 0
+        # Overestimation of every monitored item (the count it inherited on replacement)
+        self.errors = {}
+        self._bucket_of = {}
+        # Bucket with the smallest count, head of the linked list
+        self._min = None
+        # Size of the monitored keys and number of buckets, kept up to date for nbytes
+        self._key_bytes = 0
+        self._buckets = 0
+        # Monitored items replaced by new ones, for profiling
+        self.evictions = 0
+
+    @property
+    def counts(self):
+        return {item: bucket.count for item, bucket in self._bucket_of.items()}
+
+    def add(self, item):
+        self.n += 1
+        bucket = self._bucket_of.get(item)
+        if bucket is not None:
+            self._increment(item, bucket)
+            return
+
+        head = self._min
+        if len(self._bucket_of) < self.k:
+            self.errors[item] = 0
+            self._key_bytes += sys.getsizeof(item)
+            if head is None or head.count != 1:
+                head = _Bucket(1, None, head)
+                self._buckets += 1
+                if head.next is not None:
+                    head.next.prev = head
+                self._min = head
+            head.items[item] = None
+            self._bucket_of[item] = head
+        else:
+            # Take over the oldest counter with the minimum count
+            victim = next(iter(head.items))
+            self.evictions += 1
+            del head.items[victim]
+            del self._bucket_of[victim]
+            del self.errors[victim]
+            self._key_bytes += sys.getsizeof(item) - sys.getsizeof(victim)
+            self.errors[item] = head.count
+            head.items[item] = None
+            self._bucket_of[item] = head
+            self._increment(item, head)
+
+    def _increment(self, item, bucket):
+        count = bucket.count + 1
+        following = bucket.next
+        if following is not None and following.count == count:
+            target = following
+        elif len(bucket.items) == 1:
+            # Alone in its bucket and no bucket for count + 1: the bucket itself moves up
+            bucket.count = count
+            return
+        else:
+            target = _Bucket(count, bucket, following)
+            self._buckets += 1
+            bucket.next = target
+            if following is not None:
+                following.prev = target
+
+        del bucket.items[item]
+        target.items[item] = None
+        self._bucket_of[item] = target
+        if not bucket.items:
+            self._unlink(bucket)
+
+    def _unlink(self, bucket):
+        self._buckets -= 1
+        if bucket.prev is None:
+            self._min = bucket.next
+        else:
+            bucket.prev.next = bucket.next
+        if bucket.next is not None:
+            bucket.next.prev = bucket.prev
+
+    def _rebuild(self, counts, errors):
+        """Recreates the Stream-Summary from item -> count and item -> error."""
+        self.errors = {}
+        self._bucket_of = {}
+        self._min = None
+        self._key_bytes = sum(map(sys.getsizeof, counts))
+        self._buckets = 0
+        tail = None
+        for item, count in sorted(counts.items(), key=lambda entry: entry[1]):
+            if tail is None or tail.count != count:
+                bucket = _Bucket(count, tail)
+                self._buckets += 1
+                if tail is None:
+                    self._min = bucket
+                else:
+                    tail.next = bucket
+                tail = bucket
+            tail.items[item] = None
+            self._bucket_of[item] = tail
+            self.errors[item] = errors[item]
+
+    def min_count(self) -> int:
+        """Smallest monitored count once all k counters are in use, otherwise 0."""
+        if len(self._bucket_of) < self.k or self._min is None:
+            return 0
+        return self._min.count
+
+    def estimate_many(self, items) -> np.ndarray:
+        """Counts of the items as an int64 array (overestimates), 0 for unmonitored ones."""
+        items = list(items)
+        buckets = map(self._bucket_of.get, items)
+        return np.fromiter((0 if bucket is None else bucket.count for bucket in buckets),
+                           dtype=np.int64, count=len(items))
+
+    def heavy_hitters(self, threshold, items=None):
+        """Monitored items (or the given ones) with a count of at least threshold, largest first, as (items, counts)."""
+        items = list(self._bucket_of) if items is None else list(items)
+        return rank_heavy(items, self.estimate_many(items), threshold)
+
+    def nbytes(self) -> int:
+        """
+        Memory of the item maps plus the bucket objects and their item sets, in constant time:
+        key sizes and the number of buckets are tracked as they change, errors and bucket
+        counts are one int each, and every monitored item takes one slot in its bucket's set.
+        """
+        return (sys.getsizeof(self._bucket_of) + sys.getsizeof(self.errors) + self._key_bytes
+                + len(self.errors) * (INT_BYTES + DICT_ENTRY_BYTES)
+                + self._buckets * (BUCKET_BYTES + SMALL_DICT_BYTES + INT_BYTES))
+
+    def get_stats(self) -> dict:
+        """Memory of the item maps plus the bucket objects and their item sets; see nbytes."""
+        total_mem = self.nbytes()
+        return {
+            "k": self.k,
+            "tracked": len(self._bucket_of),
+            "memory_kb": total_mem / 1024,
+            "memory_mb": total_mem / (1024 * 1024)
+        }
+
+    def merge(self, other: "SpaceSaving"):
+        """
+        Merges two summaries of different parts of a stream. An item missing from a full
+        summary may have occurred up to that summary's minimum count times there, so that
+        minimum is added to its count and error. The k largest counters are kept.
+        """
+        if self.k != other.k:
+            raise ValueError(f"Cannot merge Space-Saving summaries with k={other.k} and k={self.k}")
+        self_min, other_min = self.min_count(), other.min_count()
+        counts, other_counts = self.counts, other.counts
+        errors = dict(self.errors)
+
+        for item in counts:
+            if item not in other_counts:
+                counts[item] += other_min
+                errors[item] += other_min
+        for item, count in other_counts.items():
+            if item in counts:
+                counts[item] += count
+                errors[item] += other.errors[item]
+            else:
+                counts[item] = count + self_min
+                errors[item] = other.errors[item] + self_min
+
+        if len(counts) > self.k:
+            kept = sorted(counts, key=counts.get, reverse=True)[:self.k]
+            counts = {item: counts[item] for item in kept}
+        self.n += other.n
+        self._rebuild(counts, errors)
+        return self
+
+    def to_bytes(self) -> bytes:
+        header = pack_header("IQ", SS_MAGIC, self.k, self.n)
+        items = list(self._bucket_of)
+        return header + pack_entries(items,
+                                     [self._bucket_of[item].count for item in items],
+                                     [self.errors[item] for item in items])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SpaceSaving":
+        (k, n), offset = unpack_header("IQ", SS_MAGIC, data)
+        items, (counts, errors), _ = unpack_entries(data, offset, 2)
+        ss = cls(k)
+        ss.n = n
+        ss._rebuild(dict(zip(items, counts)), dict(zip(items, errors)))
+        return ss
+
+    def save(self, path: str):
+        write_atomic(path, self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "SpaceSaving":
+        return cls.from_bytes(read_file(path))
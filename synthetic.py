@@ -0,0 +1,115 @@
+import gzip
+import time
+import argparse
+
+import numpy as np
+
+# Start of the AOL collection; generated timestamps count up from here
+START_TIME = np.datetime64("2006-03-01T00:00:00", "s")
+
+AOL_HEADER = b"AnonID\tQuery\tQueryTime\tItemRank\tClickURL\n"
+
+class ZipfStream:
+    """
+    Seeded stream of queries drawn from a Zipf(skew) distribution over a fixed vocabulary:
+    query i (1-based rank) has probability proportional to 1 / i ** skew, and is named
+    b"q<i>", so the heaviest items are q1, q2, ... skew = 0 gives a uniform stream.
+
+    Ranks are sampled a batch at a time by binary search in the precomputed CDF, so the
+    vocabulary can be large and the length unbounded. The exact count of every rank is
+    kept in a vocabulary-sized array as the stream is drawn (counts), and the expected
+    counts follow from the distribution (expected_counts), so the ground truth is known
+    without storing the stream.
+    """
+
+    def __init__(self, length: int, vocab: int = 100000, skew: float = 1.1, seed: int = 0,
+                 batch_size: int = 10000):
+        if vocab < 1 or length < 0:
+            raise ValueError("Need vocab >= 1 and length >= 0")
+        self.length = length
+        self.vocab = vocab
+        self.skew = skew
+        self.seed = seed
+        self.batch_size = batch_size
+        weights = np.arange(1, vocab + 1, dtype=np.float64) ** -skew
+        self.probabilities = weights / weights.sum()
+        self._cdf = np.cumsum(self.probabilities)
+        self._cdf[-1] = 1.0
+        self.counts = np.zeros(vocab + 1, dtype=np.int64)
+
+    def ranks(self):
+        """Batches of 1-based ranks as int64 arrays; the same seed always gives the same stream."""
+        rng = np.random.default_rng(self.seed)
+        self.counts[:] = 0
+        left = self.length
+        while left > 0:
+            size = min(self.batch_size, left)
+            ranks = np.searchsorted(self._cdf, rng.random(size), side="right") + 1
+            self.counts += np.bincount(ranks, minlength=self.vocab + 1)
+            left -= size
+            yield ranks
+
+    def __iter__(self):
+        """Batches of bytes queries, like parsing.iter_query_bytes."""
+        for ranks in self.ranks():
+            yield [b"q%d" % rank for rank in ranks.tolist()]
+
+    def query(self, rank: int) -> bytes:
+        return b"q%d" % rank
+
+    def expected_counts(self) -> np.ndarray:
+        """Expected count of every rank (index 0 unused), length * probability."""
+        return np.concatenate(([0.0], self.length * self.probabilities))
+
+    def ground_truth(self) -> dict:
+        """Exact counts of the stream drawn last, query -> count, for the queries that occurred."""
+        ranks = np.flatnonzero(self.counts)
+        return dict(zip((self.query(rank) for rank in ranks.tolist()), self.counts[ranks].tolist()))
+
+
+def write_tsv(path: str, stream: ZipfStream, users: int = 100000, per_second: int = 10):
+    """
+    Writes the stream as an AOL log that the parsers, filter_query.py and window.py accept:
+    header line, then AnonID, Query, QueryTime, and empty ItemRank and ClickURL fields.
+    Timestamps increase by one second every per_second queries. A .gz path is compressed;
+    only filter_query.py reads that, the memory-mapped parsers need its plain output.
+    Returns the number of lines written, header excluded.
+    """
+    rng = np.random.default_rng(stream.seed + 1)
+    opener = gzip.open if path.endswith(".gz") else open
+    written = 0
+    with opener(path, "wb") as f:
+        f.write(AOL_HEADER)
+        for ranks in stream.ranks():
+            n = len(ranks)
+            anon = rng.integers(1, users + 1, size=n).tolist()
+            seconds = (np.arange(written, written + n) // per_second).astype("timedelta64[s]")
+            stamps = np.datetime_as_string(START_TIME + seconds).tolist()
+            f.write(b"".join(b"%d\tq%d\t%s\t\t\n" % (user, rank, stamp.replace("T", " ").encode())
+                             for user, rank, stamp in zip(anon, ranks.tolist(), stamps)))
+            written += n
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a seeded Zipfian query stream as an AOL-style log.")
+    parser.add_argument("output", help="Log file to write (.gz is compressed, for filter_query.py)")
+    parser.add_argument("--length", type=int, default=1_000_000, help="Number of queries")
+    parser.add_argument("--vocab", type=int, default=100000, help="Number of distinct queries")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent, 0 for uniform")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stream = ZipfStream(args.length, args.vocab, args.skew, args.seed)
+    start = time.perf_counter()
+    written = write_tsv(args.output, stream)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {written:,} queries over {args.vocab:,} distinct (skew {args.skew:g}) to {args.output} "
+          f"in {elapsed:.2f} seconds")
+    print("Heaviest queries:")
+    for rank in range(1, min(10, args.vocab) + 1):
+        print(f"  q{rank:<8} {int(stream.counts[rank]):>12,} (expected {stream.expected_counts()[rank]:,.0f})")
+
+
+if __name__ == "__main__":
+    main()
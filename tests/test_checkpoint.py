@@ -0,0 +1,86 @@
+import itertools
+import functools
+
+import pytest
+
+import main
+from main import build_estimators, feed_estimators, run_pipeline
+from checkpoint import Checkpoint
+from parsing import mapped, map_offset_batches
+from synthetic import ZipfStream, write_tsv
+
+NAMES = ["gt", "mg", "lc", "ss", "cmstop", "cmscu", "cmscmm"]
+
+@pytest.fixture
+def log(tmp_path, monkeypatch):
+    # Small blocks, so the log spans many block edges to checkpoint at
+    monkeypatch.setattr(main, "map_offset_batches", functools.partial(map_offset_batches, block_size=4096))
+    path = tmp_path / "log.txt"
+    write_tsv(str(path), ZipfStream(20000, 2000, 1.1, seed=5))
+    return str(path)
+
+def state(estimators):
+    found = {}
+    for name, estimator in estimators.items():
+        if hasattr(estimator, "table"):
+            # Candidates with equal estimates may be listed in another order
+            found[name] = (estimator.n, estimator.table.tolist(),
+                           sorted(estimator.top_k_items()) if estimator.top_k else None)
+        elif name == "gt":
+            found[name] = dict(estimator)
+        else:
+            found[name] = (estimator.n, estimator.counts)
+    return found
+
+def interrupted(log, checkpoint, estimators, batches):
+    """Feeds the first batches through the checkpoint and stops as if the process died."""
+    with mapped(log) as buf:
+        start = buf.find(b"\n") + 1
+        tracked = checkpoint.track(log, map_offset_batches(buf, start, len(buf), block_size=4096), estimators)
+        feed_estimators(itertools.islice(tracked, batches), estimators)
+
+
+def test_resume_gives_same_estimators(log, tmp_path):
+    whole = build_estimators(NAMES, 0.002)
+    total, _, _ = run_pipeline(log, whole, checkpoint=Checkpoint(str(tmp_path / "whole.ckpt"), every_lines=500))
+
+    checkpoint = Checkpoint(str(tmp_path / "run.ckpt"), every_lines=500)
+    interrupted(log, checkpoint, build_estimators(NAMES, 0.002), 30)
+    assert 0 < checkpoint.lines < 20000
+    resumed = build_estimators(NAMES, 0.002)
+    resumed_total, _, _ = run_pipeline(log, resumed, checkpoint=Checkpoint(checkpoint.path), resume=True)
+    assert resumed_total == total == 20000
+    assert state(resumed) == state(whole)
+
+def test_resume_after_limit(log, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "run.ckpt"))
+    first = build_estimators(["gt"])
+    run_pipeline(log, first, max_lines=1000, checkpoint=checkpoint)
+    assert (checkpoint.lines, checkpoint.total) == (1000, 1000)
+    # A limit already reached reads nothing more; a larger one reads on from the checkpoint
+    again = build_estimators(["gt"])
+    assert run_pipeline(log, again, max_lines=1000, checkpoint=Checkpoint(checkpoint.path), resume=True)[0] == 1000
+    more = build_estimators(["gt"])
+    assert run_pipeline(log, more, max_lines=3000, checkpoint=Checkpoint(checkpoint.path), resume=True)[0] == 3000
+    assert sum(more["gt"].values()) == 3000
+
+def test_stale_checkpoint_is_rejected(log, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "run.ckpt"), every_lines=500)
+    interrupted(log, checkpoint, build_estimators(["gt"]), 30)
+    with open(log, "r+b") as f:
+        # Rewrite a query the checkpoint has already counted
+        f.seek(checkpoint.offset - 20)
+        f.write(b"x")
+    with pytest.raises(ValueError, match="not written for the current contents"):
+        Checkpoint(checkpoint.path).restore(log, build_estimators(["gt"]))
+    # A log shorter than the saved offset was truncated or replaced
+    with open(log, "r+b") as f:
+        f.truncate(checkpoint.offset - 1)
+    with pytest.raises(ValueError):
+        Checkpoint(checkpoint.path).restore(log, build_estimators(["gt"]))
+
+def test_missing_estimator_is_rejected(log, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "run.ckpt"))
+    run_pipeline(log, build_estimators(["gt"]), max_lines=100, checkpoint=checkpoint)
+    with pytest.raises(ValueError, match="no state for mg"):
+        Checkpoint(checkpoint.path).restore(log, build_estimators(["gt", "mg"]))
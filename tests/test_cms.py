@@ -0,0 +1,126 @@
+import itertools
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from cms import CountMinSketch
+from synthetic import ZipfStream
+
+STREAM = [query.decode() for query in itertools.chain.from_iterable(ZipfStream(20000, 3000, 1.1, seed=11))]
+PROBES = sorted(set(STREAM))[:500] + ["never seen", "  Q1 "]
+
+@pytest.mark.parametrize("policy", ["standard", "count-mean-min"])
+@pytest.mark.parametrize("options", [{}, {"width": 1024, "power_of_two": True}, {"top_k": 20},
+                                     {"dtype": np.uint16, "width": 8, "depth": 3}])
+def test_scalar_and_batch_paths_match(policy, options):
+    options = {"width": 500, "depth": 4, **options}
+    one = CountMinSketch(policy=policy, **options)
+    for query in STREAM:
+        one.add(query)
+    batch = CountMinSketch(policy=policy, **options)
+    for i in range(0, len(STREAM), 1000):
+        batch.add_many(STREAM[i:i + 1000])
+
+    assert one.table.dtype == batch.table.dtype
+    assert np.array_equal(one.table, batch.table)
+    assert one.n == batch.n
+    assert [one.estimate(query) for query in PROBES] == batch.estimate_many(PROBES).tolist()
+    if one.top_k:
+        assert one.top_k_items() == batch.top_k_items()
+
+def test_conservative_scalar_estimates_match_batch():
+    cms = CountMinSketch(width=300, depth=4, policy="conservative")
+    for query in STREAM:
+        cms.add(query)
+    assert [cms.estimate(query) for query in PROBES] == cms.estimate_many(PROBES).tolist()
+
+
+@pytest.mark.parametrize("policy", ["standard", "conservative", "count-mean-min"])
+def test_top_k_finds_heaviest_queries(policy):
+    truth = Counter(query.lower().strip() for query in STREAM)
+    cms = CountMinSketch(width=2000, depth=5, top_k=30, policy=policy)
+    for i in range(0, len(STREAM), 1000):
+        cms.add_many(STREAM[i:i + 1000])
+    top = cms.top_k_items()
+    assert len(top) == 30
+    assert [estimate for _, estimate in top] == sorted((estimate for _, estimate in top), reverse=True)
+    # Candidates are re-estimated on the final table
+    assert [estimate for _, estimate in top] == cms.estimate_many([item for item, _ in top]).tolist()
+    assert {item for item, _ in truth.most_common(10)} <= {item for item, _ in top}
+    assert cms.top_k_items(5) == top[:5]
+
+    items, estimates = cms.heavy_hitters(top[9][1])
+    assert items == [item for item, _ in top[:len(items)]]
+    assert len(items) >= 10 and (estimates >= top[9][1]).all()
+
+def test_top_k_kept_by_merge():
+    make = lambda: CountMinSketch(width=2000, depth=5, top_k=20)
+    first, second, single = make(), make(), make()
+    middle = len(STREAM) // 2
+    first.add_many(STREAM[:middle])
+    second.add_many(STREAM[middle:])
+    single.add_many(STREAM)
+    first.merge(second)
+    assert first.top_k_items()[:10] == single.top_k_items()[:10]
+
+def test_without_top_k():
+    cms = CountMinSketch(width=100, depth=3)
+    cms.add("foo")
+    with pytest.raises(ValueError):
+        cms.top_k_items()
+    with pytest.raises(ValueError):
+        cms.heavy_hitters(1)
+    items, estimates = cms.heavy_hitters(1, items=["foo", "bar"])
+    assert (items, estimates.tolist()) == (["foo"], [1])
+
+
+@pytest.mark.parametrize("policy", ["standard", "conservative"])
+@pytest.mark.parametrize("batch", [False, True])
+def test_narrow_counters_promote(policy, batch):
+    cms = CountMinSketch(width=64, depth=3, dtype=np.uint16, policy=policy)
+    for count in (60000, 6000, 2 ** 32):
+        if batch:
+            cms.add_many(["big"], counts=[count])
+        else:
+            cms.add("big", count)
+    assert cms.table.dtype == np.uint64
+    assert cms.estimate("big") == 66000 + 2 ** 32
+
+@pytest.mark.parametrize("policy", ["standard", "conservative"])
+@pytest.mark.parametrize("batch", [False, True])
+def test_narrow_counters_saturate(policy, batch):
+    cms = CountMinSketch(width=64, depth=3, dtype=np.uint16, policy=policy, overflow="saturate")
+    for _ in range(3):
+        if batch:
+            cms.add_many(["big", "small"], counts=[30000, 1])
+        else:
+            cms.add("big", 30000)
+            cms.add("small")
+    assert cms.table.dtype == np.uint16
+    # Capped instead of wrapping around to a small count
+    assert cms.estimate("big") == 65535
+    assert cms.estimate("small") >= 3
+
+def test_merge_promotes():
+    first = CountMinSketch(width=64, depth=3, dtype=np.uint16)
+    second = CountMinSketch(width=64, depth=3, dtype=np.uint16)
+    first.add("big", 40000)
+    second.add("big", 40000)
+    first.merge(second)
+    assert first.table.dtype == np.uint32
+    assert first.estimate("big") == 80000
+
+def test_power_of_two_width():
+    cms = CountMinSketch(width=1000, depth=4, power_of_two=True)
+    assert cms.width == 1024 and cms._mask == 1023
+    truth = Counter(query.lower().strip() for query in STREAM)
+    cms.add_many(STREAM)
+    items = list(truth)
+    assert (cms.estimate_many(items) >= np.array([truth[item] for item in items])).all()
+    # Masked columns are the same as the modulo ones
+    plain = CountMinSketch(width=1024, depth=4)
+    assert plain._mask == 1023
+    plain._mask = None
+    plain.add_many(STREAM)
+    assert np.array_equal(cms.table, plain.table)
@@ -0,0 +1,60 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from evaluation import Reservoir, candidates, count_candidates
+from misragries import MisraGries
+from cms import CountMinSketch
+
+def test_short_stream_is_kept_whole():
+    reservoir = Reservoir(size=100)
+    reservoir.add_many(list(range(60)))
+    reservoir.add(60)
+    assert reservoir.items == list(range(61))
+    assert reservoir.n == 61
+
+def test_same_sample_however_the_stream_is_batched():
+    stream = list(range(50000))
+    whole = Reservoir(size=200, seed=3)
+    whole.add_many(stream)
+    pieces = Reservoir(size=200, seed=3)
+    for start, stop in [(0, 1), (1, 150), (150, 201), (201, 9000), (9000, 50000)]:
+        pieces.add_many(stream[start:stop])
+    one = Reservoir(size=200, seed=3)
+    for item in stream[:3000]:
+        one.add(item)
+    one.add_many(stream[3000:])
+    assert whole.items == pieces.items == one.items
+    assert len(whole.items) == 200 and whole.n == 50000
+
+def test_sample_is_uniform():
+    # Over many seeds every stream position is about equally likely to be kept
+    n, size, seeds = 10000, 100, 200
+    kept = np.zeros(n)
+    for seed in range(seeds):
+        reservoir = Reservoir(size=size, seed=seed)
+        reservoir.add_many(list(range(n)))
+        assert len(set(reservoir.items)) == size
+        kept[reservoir.items] += 1
+    per_tenth = kept.reshape(10, -1).sum(axis=1)
+    expected = size * seeds / 10
+    assert np.all(np.abs(per_tenth - expected) < 0.15 * expected)
+
+def test_rejects_empty_reservoir():
+    with pytest.raises(ValueError):
+        Reservoir(size=0)
+
+
+def test_candidates_and_exact_counts():
+    stream = [b"a"] * 50 + [b"b"] * 30 + [b"c%d" % i for i in range(40)] + [b"a"] * 10
+    mg = MisraGries(5)
+    for item in stream:
+        mg.add(item)
+    cms = CountMinSketch(width=200, depth=4, top_k=2)
+    cms.add_many(stream)
+    found = candidates({"mg": mg, "cms": cms}, extra=[b"c7"])
+    assert {b"a", b"b", b"c7"} <= found
+    batches = [stream[i:i + 16] for i in range(0, len(stream), 16)]
+    counts = count_candidates(batches, found)
+    assert counts == {item: count for item, count in Counter(stream).items() if item in found}
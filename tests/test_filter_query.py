@@ -0,0 +1,40 @@
+import gzip
+
+import pytest
+
+from filter_query import expand_inputs, filter_aol_queries
+
+HEADER = b"AnonID\tQuery\tQueryTime\tItemRank\tClickURL\n"
+
+def test_outputs_are_not_inputs(tmp_path):
+    (tmp_path / "a.txt").write_bytes(HEADER + b"1\tfoo\n")
+    (tmp_path / "b.txt.gz").write_bytes(gzip.compress(HEADER + b"2\tbar\n"))
+    for name in ("clean.txt", "invalid.txt", "clean.txt.part0", "invalid.txt.part1"):
+        (tmp_path / name).write_bytes(b"")
+    outputs = (str(tmp_path / "clean.txt"), str(tmp_path / "invalid.txt"))
+    expected = [str(tmp_path / "a.txt"), str(tmp_path / "b.txt.gz")]
+    assert expand_inputs(str(tmp_path), outputs) == expected
+    assert expand_inputs(str(tmp_path / "*"), outputs) == expected
+    with pytest.raises(FileNotFoundError):
+        expand_inputs(outputs[0], outputs)
+
+def test_rerun_in_input_directory(tmp_path):
+    (tmp_path / "a.txt").write_bytes(HEADER + b"1\tfoo\n1\t-\n")
+    (tmp_path / "b.txt").write_bytes(HEADER + b"2\tbar\n")
+    clean, invalid = str(tmp_path / "clean.txt"), str(tmp_path / "invalid.txt")
+    for _ in range(2):
+        result = filter_aol_queries(str(tmp_path), clean, invalid, workers=1)
+        assert [row["lines"] for row in result["files"]] == [2, 1]
+        assert (tmp_path / "clean.txt").read_bytes() == HEADER + b"1\tfoo\n2\tbar\n"
+        assert (tmp_path / "invalid.txt").read_bytes() == b"1\t-\n"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.txt", "b.txt", "clean.txt", "invalid.txt"]
+
+def test_parts_without_final_newline_stay_apart(tmp_path):
+    (tmp_path / "a.txt").write_bytes(HEADER + b"1\tfoo")
+    (tmp_path / "b.txt").write_bytes(HEADER + b"2\tbar")
+    (tmp_path / "c.txt").write_bytes(b"")
+    out = tmp_path / "out"
+    out.mkdir()
+    filter_aol_queries(str(tmp_path / "*.txt"), str(out / "clean.txt"), str(out / "invalid.txt"), workers=1)
+    assert (out / "clean.txt").read_bytes() == HEADER + b"1\tfoo\n2\tbar\n"
+    assert (out / "invalid.txt").read_bytes() == b""
@@ -0,0 +1,32 @@
+import pytest
+
+from hashers import Hasher, HASHER_NAMES, make_hasher
+
+ITEMS = [b"", b"q1", b"weather", "café", b"caf\xc3\xa9", b"x" * 1000] + [b"q%d" % i for i in range(2000)]
+
+@pytest.mark.parametrize("name", HASHER_NAMES)
+@pytest.mark.parametrize("seed", [0, 1, 2 ** 40 + 7])
+def test_pairs_match_pair(name, seed):
+    hasher = make_hasher(name, seed)
+    pairs = hasher.pairs(ITEMS)
+    assert pairs.shape == (len(ITEMS), 2)
+    assert pairs.tolist() == [list(hasher.pair(item)) for item in ITEMS]
+    assert hasher.pairs([]).shape == (0, 2)
+    # str is hashed as its UTF-8 bytes
+    assert hasher.pair("café") == hasher.pair(b"caf\xc3\xa9")
+
+@pytest.mark.parametrize("name", HASHER_NAMES)
+def test_seed_picks_another_hash(name):
+    assert make_hasher(name, 0).pairs(ITEMS).tolist() != make_hasher(name, 1).pairs(ITEMS).tolist()
+
+@pytest.mark.parametrize("name", ["crc32-mix", "blake2b"])
+def test_h2_is_odd(name):
+    # Keeps the rows on different columns of a power-of-two table
+    assert (make_hasher(name).pairs(ITEMS)[:, 1] % 2 == 1).all()
+
+def test_registry():
+    assert make_hasher("crc32-mix", 5).seed == 5
+    with pytest.raises(ValueError):
+        make_hasher("md5")
+    with pytest.raises(TypeError):
+        Hasher()
@@ -0,0 +1,40 @@
+import math
+import itertools
+
+import pytest
+
+from lossy import LossyCounting
+from synthetic import ZipfStream
+
+def zipf_stream(skew, length=60000, vocab=8000, seed=7):
+    return list(itertools.chain.from_iterable(ZipfStream(length, vocab, skew, seed)))
+
+def lossy_counting_full_scan(epsilon, stream):
+    """The original Lossy Counting: every tracked item is checked at each bucket boundary."""
+    width = math.ceil(1 / epsilon)
+    counts, bucket_id, current_bucket = {}, {}, 1
+    for n, item in enumerate(stream, 1):
+        if item in counts:
+            counts[item] += 1
+        else:
+            counts[item] = 1
+            bucket_id[item] = current_bucket - 1
+        if n % width == 0:
+            for key in [key for key in counts if counts[key] + bucket_id[key] <= current_bucket]:
+                del counts[key]
+                del bucket_id[key]
+            current_bucket += 1
+    return counts, bucket_id
+
+
+@pytest.mark.parametrize("epsilon", [0.05, 0.002, 0.0005])
+@pytest.mark.parametrize("skew", [0.8, 1.2])
+def test_matches_full_scan(epsilon, skew):
+    stream = zipf_stream(skew)
+    lc = LossyCounting(epsilon)
+    for item in stream:
+        lc.add(item)
+    counts, bucket_id = lossy_counting_full_scan(epsilon, stream)
+    assert lc.counts == counts
+    assert lc.bucket_id == bucket_id
+    assert lc.n == len(stream)
@@ -0,0 +1,43 @@
+import itertools
+
+import pytest
+
+from misragries import MisraGries
+from synthetic import ZipfStream
+
+def zipf_stream(skew, length=60000, vocab=8000, seed=7):
+    return list(itertools.chain.from_iterable(ZipfStream(length, vocab, skew, seed)))
+
+def misra_gries_full_scan(k, stream):
+    """The original per-key decrement: every candidate is decremented, the zeros dropped."""
+    candidates = {}
+    for element in stream:
+        if element in candidates:
+            candidates[element] += 1
+        elif len(candidates) < k - 1:
+            candidates[element] = 1
+        else:
+            for key in list(candidates.keys()):
+                candidates[key] -= 1
+                if candidates[key] == 0:
+                    del candidates[key]
+    return candidates
+
+
+@pytest.mark.parametrize("k", [2, 10, 200, 2000])
+@pytest.mark.parametrize("skew", [0.8, 1.2])
+def test_matches_full_scan(k, skew):
+    stream = zipf_stream(skew)
+    mg = MisraGries(k)
+    for item in stream:
+        mg.add(item)
+    assert mg.counts == misra_gries_full_scan(k, stream)
+    assert mg.n == len(stream)
+
+def test_decrements_counted():
+    mg = MisraGries(3)
+    for item in [b"a", b"b", b"c", b"a", b"a", b"d", b"e"]:
+        mg.add(item)
+    # c and e each found both counters in use: one global decrement apiece
+    assert mg.counts == {b"a": 1}
+    assert mg.decrements == 2
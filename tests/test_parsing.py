@@ -0,0 +1,51 @@
+import pytest
+
+from cms import CountMinSketch, process_aol_dataset
+from parsing import map_batches, chunk_offsets, iter_query_bytes
+
+HEADER = b"AnonID\tQuery\tQueryTime\tItemRank\tClickURL\n"
+ROWS = (b"1\tFoo Bar \t2006-03-01 07:17:12\t\t\n"
+        b"2\t-\t2006-03-01 07:17:13\t\t\n"
+        b"3\tfoo bar\t2006-03-01 07:17:14\t\t\n"
+        b"4\tWeather\t2006-03-01 07:17:15\t\t\n")
+
+@pytest.fixture
+def log(tmp_path):
+    def write(header):
+        path = tmp_path / ("header.txt" if header else "plain.txt")
+        path.write_bytes((HEADER if header else b"") + ROWS)
+        return str(path)
+    return write
+
+
+def test_map_batches_normalizes_queries():
+    assert list(map_batches(HEADER + ROWS, len(HEADER), len(HEADER + ROWS))) == [
+        [b"foo bar", b"foo bar", b"weather"]]
+    # A last line without a newline is still read
+    assert list(map_batches(b"1\tLast", 0, 6)) == [[b"last"]]
+
+def test_iter_query_bytes_skips_header(log):
+    assert [q for batch in iter_query_bytes(log(True)) for q in batch] == [b"foo bar", b"foo bar", b"weather"]
+    assert [q for batch in iter_query_bytes(log(True), max_lines=1) for q in batch] == [b"foo bar"]
+
+# limit counts lines from the top of the file, header included; line 2 of ROWS is invalid
+@pytest.mark.parametrize("header, limit, expected", [
+    (True, None, 3), (True, 0, 0), (True, 1, 0), (True, 2, 1), (True, 3, 1),
+    (False, None, 3), (False, 0, 0), (False, 1, 1), (False, 2, 1), (False, 3, 2),
+])
+def test_process_aol_dataset_limit(log, header, limit, expected):
+    cms = CountMinSketch(width=100, depth=3)
+    total, counts = process_aol_dataset(log(header), cms, limit=limit)
+    assert total == cms.n == sum(counts.values()) == expected
+
+@pytest.mark.parametrize("max_lines, expected", [(0, []), (1, 1), (2, 2), (None, 4)])
+def test_chunk_offsets_limit(log, max_lines, expected):
+    path = log(True)
+    chunks = chunk_offsets(path, 2, max_lines=max_lines)
+    if expected == []:
+        assert chunks == []
+        return
+    with open(path, "rb") as f:
+        data = f.read()
+    assert chunks[0][0] == len(HEADER)
+    assert b"".join(data[a:b] for a, b in chunks).count(b"\n") == expected
@@ -0,0 +1,58 @@
+import pytest
+
+from main import build_estimators, feed_estimators
+from parsing import iter_query_bytes
+from hashers import make_hasher
+from query_cache import QueryCache, cache_log, feed_cache, NORMALIZATION
+from synthetic import ZipfStream, write_tsv
+
+NAMES = ["gt", "mg", "lc", "ss", "cms", "cmscmm", "cmstop"]
+
+@pytest.fixture
+def log(tmp_path):
+    path = tmp_path / "log.txt"
+    write_tsv(str(path), ZipfStream(20000, 3000, 1.1, seed=9))
+    return str(path)
+
+def state(estimators):
+    return {name: (estimator.table.tolist() if hasattr(estimator, "table")
+                   else dict(estimator) if name == "gt" else estimator.counts)
+            for name, estimator in estimators.items()}
+
+
+@pytest.mark.parametrize("hasher", [None, "crc32-mix"])
+def test_round_trip(log, tmp_path, hasher):
+    path = str(tmp_path / "log.qc")
+    stream = [query for batch in iter_query_bytes(log) for query in batch]
+    assert cache_log(log, path, hasher, seed=0) == (len(stream), len(set(stream)))
+    with QueryCache(path) as cache:
+        assert len(cache) == len(stream)
+        assert cache.keys == list(dict.fromkeys(stream))
+        assert [query for batch in cache.batches(batch_size=777) for query in batch] == stream
+        assert dict(zip(cache.keys, cache.counts.tolist())) == {key: stream.count(key) for key in cache.keys}
+        first = stream[:1000]
+        assert cache.frequencies(1000).tolist() == [first.count(key) for key in cache.keys]
+        if hasher:
+            assert cache.hashes.tolist() == make_hasher(hasher).pairs(cache.keys).tolist()
+        else:
+            assert cache.hashes is None
+
+@pytest.mark.parametrize("hasher", [None, "crc32-mix"])
+@pytest.mark.parametrize("limit", [None, 5000])
+def test_feed_cache_matches_log(log, tmp_path, hasher, limit):
+    path = str(tmp_path / "log.qc")
+    cache_log(log, path, hasher)
+    from_log = build_estimators(NAMES, 0.002)
+    total = feed_estimators(iter_query_bytes(log, max_lines=limit), from_log)[0]
+    from_cache = build_estimators(NAMES, 0.002)
+    with QueryCache(path) as cache:
+        assert feed_cache(cache, from_cache, max_queries=limit)[0] == total
+    assert state(from_cache) == state(from_log)
+
+def test_other_normalization_is_refused(log, tmp_path):
+    path = tmp_path / "log.qc"
+    cache_log(log, str(path))
+    data = path.read_bytes()
+    path.write_bytes(data.replace(NORMALIZATION, NORMALIZATION.replace(b"ascii", b"utf-8")))
+    with pytest.raises(ValueError, match="normalization"):
+        QueryCache(str(path))
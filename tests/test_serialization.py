@@ -0,0 +1,166 @@
+import struct
+import itertools
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from cms import CountMinSketch
+from misragries import MisraGries
+from lossy import LossyCounting
+from spacesaving import SpaceSaving
+from main import GroundTruth
+from synthetic import ZipfStream
+from sketch_io import pack_entries, unpack_entries
+
+STREAM = list(itertools.chain.from_iterable(ZipfStream(40000, 5000, 1.1, seed=3)))
+TRUTH = Counter(STREAM)
+
+def feed(estimator, items):
+    if hasattr(estimator, "add_many"):
+        estimator.add_many(items)
+    else:
+        for item in items:
+            estimator.add(item)
+    return estimator
+
+def halves(make):
+    middle = len(STREAM) // 2
+    return feed(make(), STREAM[:middle]), feed(make(), STREAM[middle:])
+
+def cms_state(cms):
+    return (cms.table.dtype, cms.table.tolist(), cms.n, cms.policy, cms.overflow,
+            cms.hasher.name, cms.hasher.seed, cms.top_k_items() if cms.top_k else None)
+
+# Sketches a from_bytes round trip must restore
+SKETCHES = {
+    "standard": lambda: CountMinSketch(width=2000, depth=4),
+    "conservative": lambda: CountMinSketch(width=2000, depth=4, policy="conservative", seed=5),
+    "top_k": lambda: CountMinSketch(width=2000, depth=4, top_k=20),
+    "compact": lambda: CountMinSketch(width=1500, depth=3, dtype=np.uint16, power_of_two=True,
+                                      overflow="saturate"),
+    "count-mean-min": lambda: CountMinSketch(width=2000, depth=4, policy="count-mean-min",
+                                             hasher="blake2b"),
+}
+
+
+@pytest.mark.parametrize("name", SKETCHES)
+def test_cms_round_trip(name):
+    cms = feed(SKETCHES[name](), STREAM)
+    assert cms_state(CountMinSketch.from_bytes(cms.to_bytes())) == cms_state(cms)
+
+def test_counters_round_trip():
+    mg = feed(MisraGries(50), STREAM)
+    restored = MisraGries.from_bytes(mg.to_bytes())
+    assert (restored.k, restored.n, restored.counts) == (mg.k, mg.n, mg.counts)
+
+    lc = feed(LossyCounting(0.002), STREAM)
+    restored = LossyCounting.from_bytes(lc.to_bytes())
+    assert (restored.epsilon, restored.n, restored.current_bucket) == (lc.epsilon, lc.n, lc.current_bucket)
+    assert (restored.counts, restored.bucket_id) == (lc.counts, lc.bucket_id)
+    # The restored summary keeps counting like the original
+    assert feed(restored, STREAM).counts == feed(lc, STREAM).counts
+
+    ss = feed(SpaceSaving(50), STREAM)
+    restored = SpaceSaving.from_bytes(ss.to_bytes())
+    assert (restored.k, restored.n, restored.min_count()) == (ss.k, ss.n, ss.min_count())
+    assert (restored.counts, restored.errors) == (ss.counts, ss.errors)
+
+    gt = feed(GroundTruth(), STREAM)
+    assert GroundTruth.from_bytes(gt.to_bytes()) == gt == TRUTH
+
+
+@pytest.mark.parametrize("policy", ["standard", "count-mean-min"])
+def test_cms_merge_equals_single_pass(policy):
+    make = lambda: CountMinSketch(width=1000, depth=4, policy=policy, top_k=10)
+    first, second = halves(make)
+    first.merge(second)
+    single = feed(make(), STREAM)
+    assert np.array_equal(first.table, single.table)
+    assert first.n == single.n == len(STREAM)
+    assert first.top_k_items() == single.top_k_items()
+
+def test_cms_conservative_merge_bounds():
+    first, second = halves(lambda: CountMinSketch(width=1000, depth=4, policy="conservative"))
+    first.merge(second)
+    standard = feed(CountMinSketch(width=1000, depth=4), STREAM)
+    items = list(TRUTH)
+    merged = first.estimate_many(items)
+    true = np.array([TRUTH[item] for item in items])
+    assert (true <= merged).all()
+    assert (merged <= standard.estimate_many(items)).all()
+
+@pytest.mark.parametrize("k", [10, 100])
+def test_misra_gries_merge_bound(k):
+    first, second = halves(lambda: MisraGries(k))
+    first.merge(second)
+    assert first.n == len(STREAM)
+    assert len(first.counts) <= k - 1
+    for item, true in TRUTH.items():
+        assert 0 <= true - first.counts.get(item, 0) <= len(STREAM) / k
+
+@pytest.mark.parametrize("epsilon", [0.01, 0.001])
+def test_lossy_counting_merge_bound(epsilon):
+    first, second = halves(lambda: LossyCounting(epsilon))
+    assert first.merge(second) is first
+    assert first.n == len(STREAM)
+    for item, true in TRUTH.items():
+        assert 0 <= true - first.counts.get(item, 0) <= epsilon * len(STREAM)
+
+@pytest.mark.parametrize("k", [10, 100])
+def test_space_saving_merge_bound(k):
+    first, second = halves(lambda: SpaceSaving(k))
+    assert first.merge(second) is first
+    assert first.n == len(STREAM)
+    counts = first.counts
+    assert len(counts) <= k
+    for item, count in counts.items():
+        assert count - first.errors[item] <= TRUTH[item] <= count <= TRUTH[item] + len(STREAM) / k
+
+def test_ground_truth_merge():
+    first, second = halves(GroundTruth)
+    assert first.merge(second) == TRUTH
+
+
+@pytest.mark.parametrize("first, second", [
+    (CountMinSketch(width=100, depth=4), CountMinSketch(width=200, depth=4)),
+    (CountMinSketch(width=100, depth=4), CountMinSketch(width=100, depth=3)),
+    (CountMinSketch(width=100, depth=4), CountMinSketch(width=100, depth=4, policy="conservative")),
+    (CountMinSketch(width=100, depth=4), CountMinSketch(width=100, depth=4, seed=1)),
+    (CountMinSketch(width=100, depth=4), CountMinSketch(width=100, depth=4, hasher="blake2b")),
+    (MisraGries(10), MisraGries(20)),
+    (LossyCounting(0.01), LossyCounting(0.001)),
+    (SpaceSaving(10), SpaceSaving(20)),
+])
+def test_merge_rejects_mismatched_parameters(first, second):
+    with pytest.raises(ValueError):
+        first.merge(second)
+
+@pytest.mark.parametrize("cls, other", [
+    (CountMinSketch, MisraGries(10)),
+    (MisraGries, SpaceSaving(10)),
+    (SpaceSaving, LossyCounting(0.01)),
+    (LossyCounting, GroundTruth()),
+    (GroundTruth, CountMinSketch(width=10, depth=2)),
+])
+def test_from_bytes_rejects_other_formats(cls, other):
+    with pytest.raises(ValueError):
+        cls.from_bytes(other.to_bytes())
+    with pytest.raises(ValueError):
+        cls.from_bytes(b"")
+
+def test_entries_are_little_endian():
+    data = pack_entries([b"ab", b"c"], [1, -2])
+    assert data == (struct.pack("<IB", 2, True) + struct.pack("<2I", 2, 1) + b"abc"
+                    + struct.pack("<2q", 1, -2))
+    assert unpack_entries(data, 0, 1) == ([b"ab", b"c"], [[1, -2]], len(data))
+
+@pytest.mark.parametrize("dtype, code", [(np.uint16, b"<u2"), (np.uint32, b"<u4"), (np.uint64, b"<u8")])
+def test_cms_stores_counter_width(dtype, code):
+    cms = CountMinSketch(width=10, depth=2, dtype=dtype)
+    cms.add("x", 300)
+    data = cms.to_bytes()
+    assert data[12:15] == code
+    # The table follows the header as little-endian counters of that width
+    table = np.frombuffer(data, dtype=code.decode(), count=20, offset=len(data) - 20 * np.dtype(dtype).itemsize)
+    assert table.tolist() == cms.table.ravel().tolist()
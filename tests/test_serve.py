@@ -0,0 +1,65 @@
+import os
+
+from serve import LogFollower
+
+HEADER = b"AnonID\tQuery\tQueryTime\tItemRank\tClickURL\n"
+
+def append(path, data):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+def test_complete_lines_only(tmp_path):
+    log = tmp_path / "log.txt"
+    log.write_bytes(HEADER + b"1\tfoo\n2\tba")
+    follower = LogFollower(str(log))
+    assert follower.read() == b"1\tfoo\n"
+    assert follower.read() == b""
+    append(log, b"r\n3\tbaz")
+    assert follower.read() == b"2\tbar\n"
+    assert follower.offset == len(HEADER) + len(b"1\tfoo\n2\tbar\n")
+
+def test_header_only_when_it_is_one(tmp_path):
+    log = tmp_path / "log.txt"
+    log.write_bytes(b"1\tanonid fan club\n")
+    assert LogFollower(str(log)).read() == b"1\tanonid fan club\n"
+
+def test_missing_file_is_waited_for(tmp_path):
+    log = tmp_path / "log.txt"
+    follower = LogFollower(str(log), from_end=True)
+    assert follower.read() == b""
+    log.write_bytes(HEADER + b"1\tfoo\n")
+    # A log that appears later is new, so it is read from the start
+    assert follower.read() == b"1\tfoo\n"
+
+def test_rotation_reads_new_file_from_start(tmp_path):
+    log = tmp_path / "log.txt"
+    log.write_bytes(HEADER + b"1\tfoo\n1\tfoo\n")
+    follower = LogFollower(str(log))
+    assert follower.read() == b"1\tfoo\n1\tfoo\n"
+    # Replaced by a new file (new inode), header included
+    rotated = tmp_path / "new.txt"
+    rotated.write_bytes(HEADER + b"2\tbar\n")
+    os.replace(rotated, log)
+    assert follower.read() == b"2\tbar\n"
+    # Truncated in place
+    log.write_bytes(b"3\tbaz\n")
+    assert follower.read() == b"3\tbaz\n"
+
+def test_from_end_starts_after_last_complete_line(tmp_path):
+    log = tmp_path / "log.txt"
+    log.write_bytes(HEADER + b"1\told\n2\tpart")
+    follower = LogFollower(str(log), from_end=True)
+    assert follower.read() == b""
+    append(log, b"ial\n3\tnew\n")
+    # The line being written when the follower started is read whole
+    assert follower.read() == b"2\tpartial\n3\tnew\n"
+
+def test_from_end_of_complete_log(tmp_path, monkeypatch):
+    # A last newline further back than one read
+    monkeypatch.setattr("serve.READ_SIZE", 4)
+    log = tmp_path / "log.txt"
+    log.write_bytes(HEADER + b"1\told\n2\tstill being written")
+    follower = LogFollower(str(log), from_end=True)
+    assert follower.offset is None and follower.read() == b""
+    assert follower.offset == len(HEADER) + len(b"1\told\n")
@@ -0,0 +1,60 @@
+import itertools
+from collections import Counter
+
+import pytest
+
+from spacesaving import SpaceSaving
+from synthetic import ZipfStream
+
+def zipf_stream(skew, length=60000, vocab=8000, seed=7):
+    return list(itertools.chain.from_iterable(ZipfStream(length, vocab, skew, seed)))
+
+def buckets(ss):
+    """(count, items) of the Stream-Summary buckets from the minimum up."""
+    found, bucket, previous = [], ss._min, None
+    while bucket is not None:
+        assert bucket.prev is previous
+        found.append((bucket.count, list(bucket.items)))
+        previous, bucket = bucket, bucket.next
+    return found
+
+
+@pytest.mark.parametrize("k", [1, 10, 500])
+@pytest.mark.parametrize("skew", [0.8, 1.2])
+def test_error_bounds(k, skew):
+    stream = zipf_stream(skew)
+    truth = Counter(stream)
+    ss = SpaceSaving(k)
+    for item in stream:
+        ss.add(item)
+    counts = ss.counts
+    assert len(counts) <= k
+    assert sum(counts.values()) == ss.n == len(stream)
+    for item, count in counts.items():
+        assert count - ss.errors[item] <= truth[item] <= count
+    # An unmonitored item occurred at most as often as the smallest counter
+    floor = ss.min_count()
+    assert all(truth[item] <= floor for item in truth.keys() - counts.keys())
+
+def test_stream_summary_stays_ordered():
+    ss = SpaceSaving(50)
+    for item in zipf_stream(1.0, length=5000):
+        ss.add(item)
+    found = buckets(ss)
+    # Strictly increasing counts, no empty bucket, every item in the bucket of its count
+    assert [count for count, _ in found] == sorted({count for count, _ in found})
+    assert all(items for _, items in found)
+    assert {item: count for count, items in found for item in items} == ss.counts
+    assert ss._buckets == len(found)
+    assert ss.min_count() == found[0][0]
+
+def test_queries():
+    ss = SpaceSaving(3)
+    for item in [b"a", b"b", b"a", b"c", b"a", b"d"]:
+        ss.add(item)
+    # d took over the oldest minimum counter (b's) and inherited its count as error
+    assert ss.counts == {b"a": 3, b"c": 1, b"d": 2}
+    assert ss.errors == {b"a": 0, b"c": 0, b"d": 1}
+    assert ss.estimate_many([b"a", b"d", b"b"]).tolist() == [3, 2, 0]
+    items, counts = ss.heavy_hitters(2)
+    assert (items, counts.tolist()) == ([b"a", b"d"], [3, 2])
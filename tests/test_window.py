@@ -0,0 +1,58 @@
+import pytest
+
+from main import GroundTruth
+from window import SlidingWindow, DecayedCountMin
+
+EVENTS = [(b"a", 0), (b"b", 50), (b"a", 120), (b"c", 180), (b"a", 250), (b"b", 299)]
+
+def test_old_intervals_expire():
+    window = SlidingWindow(GroundTruth, window=300, interval=100)
+    for item, timestamp in EVENTS:
+        window.add(item, timestamp)
+    assert window.summary() == {b"a": 3, b"b": 2, b"c": 1}
+    # The first interval [0, 100) leaves the window once [300, 400) starts
+    window.add(b"c", 310)
+    assert window.summary() == {b"a": 2, b"b": 1, b"c": 2}
+    assert window.summary(100) == {b"c": 1}
+    assert window.summary(150) == {b"a": 1, b"b": 1, b"c": 1}
+    # Too old for the ring: dropped and counted as late
+    window.add(b"a", 90)
+    assert window.late == 1 and window.n == 7
+    assert window.get_stats()["sub_sketches"] == 3
+
+def test_batch_matches_one_at_a_time():
+    one = SlidingWindow(GroundTruth, window=300, interval=100)
+    batch = SlidingWindow(GroundTruth, window=300, interval=100)
+    events = EVENTS + [(b"d", 450), (b"a", 120), (b"e", 400)]
+    for item, timestamp in sorted(events, key=lambda event: event[1]):
+        one.add(item, timestamp)
+    batch.add_many([item for item, _ in events], [timestamp for _, timestamp in events])
+    assert batch.summary() == one.summary() == {b"a": 1, b"b": 1, b"d": 1, b"e": 1}
+    # The batch is fed newest first, so the intervals already out of the window are late
+    assert (batch.n, batch.late) == (4, 5)
+
+def test_rejects_bad_sizes():
+    with pytest.raises(ValueError):
+        SlidingWindow(GroundTruth, window=100, interval=300)
+
+
+def test_decay_halves_per_half_life():
+    sketch = DecayedCountMin(width=500, depth=4, half_life=3600, top_k=5)
+    sketch.add(b"old", 0)
+    sketch.add_many([b"new", b"new"], [3600, 3600])
+    assert sketch.estimate(b"old") == pytest.approx(0.5)
+    assert sketch.estimate(b"new") == pytest.approx(2.0)
+    # As of an hour later everything has halved again
+    assert sketch.estimate(b"old", now=7200) == pytest.approx(0.25)
+    assert [item for item, _ in sketch.top_k_items()] == [b"new", b"old"]
+
+def test_rescale_keeps_estimates(monkeypatch):
+    monkeypatch.setattr(DecayedCountMin, "RESCALE_AT", 2)
+    sketch = DecayedCountMin(width=500, depth=4, half_life=10, top_k=5)
+    sketch.add(b"old", 0)
+    sketch.add(b"new", 25)
+    sketch.add(b"new", 40)
+    assert sketch.rescales == 1
+    assert sketch.estimate(b"old") == pytest.approx(2 ** -4)
+    assert sketch.estimate(b"new") == pytest.approx(1 + 2 ** -1.5)
+    assert dict(sketch.top_k_items())[b"old"] == pytest.approx(2 ** -4)
@@ -0,0 +1,301 @@
+import sys
+import math
+import heapq
+import argparse
+import time
+
+import numpy as np
+
+from parsing import iter_timed_queries, to_text
+from hashers import make_hasher
+from memory import FLOAT_BYTES
+from profiling import Profiler, print_profile
+
+class SlidingWindow:
+    """
+    Heavy hitters over recent time instead of the whole history.
+
+    The timeline is cut into fixed intervals and every interval gets its own sub-sketch,
+    built by factory() (any estimator with add and merge: CountMinSketch, MisraGries,
+    LossyCounting, SpaceSaving). Only the newest window // interval of them are kept in a
+    ring, so memory is bounded no matter how long the stream runs. A window query merges
+    the sub-sketches of the intervals it covers into one fresh estimator; nothing already
+    seen is read again.
+
+    The window ends at the newest timestamp seen so far. Items from an interval that has
+    already left the ring are dropped and counted in late. The AOL files are ordered by
+    user, not by time, so sort them on QueryTime first (sort -t$'\\t' -k3) to window them.
+    """
+
+    def __init__(self, factory, window: int = 3600, interval: int = 300):
+        if interval < 1 or window < interval:
+            raise ValueError("Need 1 <= interval <= window (both in seconds)")
+        self.factory = factory
+        self.window = window
+        self.interval = interval
+        self.slots = math.ceil(window / interval)
+        # Sub-sketch of each slot and the interval number it currently holds
+        self._ring = [None] * self.slots
+        self._epochs = [None] * self.slots
+        # Newest interval number seen
+        self.latest = None
+        self.n = 0
+        self.late = 0
+
+    def _slot(self, epoch: int):
+        """Sub-sketch for an interval, or None once it has left the window."""
+        if self.latest is None or epoch > self.latest:
+            self.latest = epoch
+        elif epoch <= self.latest - self.slots:
+            return None
+        i = epoch % self.slots
+        if self._epochs[i] != epoch:
+            # Reuse the slot of the interval that just expired
+            self._ring[i] = self.factory()
+            self._epochs[i] = epoch
+        return self._ring[i]
+
+    def add(self, item, timestamp: int):
+        sketch = self._slot(int(timestamp) // self.interval)
+        if sketch is None:
+            self.late += 1
+            return
+        self.n += 1
+        sketch.add(item)
+
+    def add_many(self, items, timestamps):
+        """
+        Feeds a batch grouped by interval, so every sub-sketch takes its slice in one call.
+        Groups go newest first: intervals already pushed out of the window by the newest
+        timestamp are then skipped without building a sub-sketch for them.
+        """
+        epochs = np.asarray(timestamps, dtype=np.int64) // self.interval
+        if not len(epochs):
+            return
+        order = np.argsort(epochs, kind="stable")
+        epochs = epochs[order]
+        bounds = [0, *(np.flatnonzero(np.diff(epochs)) + 1).tolist(), len(order)]
+        for start, stop in reversed(list(zip(bounds, bounds[1:]))):
+            sketch = self._slot(int(epochs[start]))
+            if sketch is None:
+                self.late += stop - start
+                continue
+            group = [items[i] for i in order[start:stop].tolist()]
+            self.n += len(group)
+            if hasattr(sketch, "add_many"):
+                sketch.add_many(group)
+            else:
+                for item in group:
+                    sketch.add(item)
+
+    def summary(self, seconds: int = None):
+        """
+        One estimator covering the last seconds of the stream (the whole window by default),
+        rounded up to whole intervals.
+        """
+        seconds = self.window if seconds is None else seconds
+        span = min(math.ceil(seconds / self.interval), self.slots)
+        merged = self.factory()
+        if self.latest is None:
+            return merged
+        for epoch, sketch in zip(self._epochs, self._ring):
+            if epoch is not None and self.latest - span < epoch <= self.latest:
+                merged.merge(sketch)
+        return merged
+
+    def get_stats(self) -> dict:
+        """Memory of the live sub-sketches."""
+        live = [sketch for sketch in self._ring if sketch is not None]
+        total_kb = sum(sketch.nbytes() for sketch in live) / 1024
+        return {
+            "window": self.window,
+            "interval": self.interval,
+            "sub_sketches": len(live),
+            "late": self.late,
+            "memory_kb": total_kb,
+            "memory_mb": total_kb / 1024
+        }
+
+
+class DecayedCountMin:
+    """
+    Count-Min Sketch with exponential time decay: an occurrence that is t seconds older than
+    the newest timestamp counts 2 ** (-t / half_life), so no window boundary is needed.
+
+    Forward decay: instead of shrinking every counter as time passes, each occurrence is
+    added with weight 2 ** ((timestamp - landmark) / half_life) and estimates are scaled
+    down to the newest timestamp when read. The weights grow over time, so the table is
+    rescaled and the landmark moved before they can overflow a float64.
+    Relative order never changes with time, which lets the top-k candidates keep
+    their forward-weighted estimates as they are.
+    """
+    # Rescale once a weight would exceed 2 ** RESCALE_AT
+    RESCALE_AT = 256
+
+    def __init__(self, width: int = 10000, depth: int = 5, half_life: float = 3600,
+                 top_k: int = None, hasher: str = "crc32-mix", seed: int = 0):
+        self.width = width
+        self.depth = depth
+        self.half_life = half_life
+        # Same layout and indexing as CountMinSketch, with float weights as counters
+        self.table = np.zeros((depth, width), dtype=np.float64)
+        self._flat = self.table.reshape(-1)
+        self._row_ids = np.arange(depth, dtype=np.uint64)
+        self._row_offsets = self._row_ids * np.uint64(width)
+        self.hasher = make_hasher(hasher, seed)
+        self.landmark = None
+        self.latest = None
+        self.n = 0
+        # item -> forward-weighted estimate, trimmed back to top_k when it doubles
+        self.top_k = top_k
+        self._top = {}
+        # Times the table was rescaled, for profiling
+        self.rescales = 0
+
+    def _get_indices(self, items) -> np.ndarray:
+        hashes = self.hasher.pairs(items)
+        return (hashes[:, 0:1] + self._row_ids * hashes[:, 1:2]) % np.uint64(self.width) + self._row_offsets
+
+    def _rescale(self, landmark: int):
+        factor = 2.0 ** ((self.landmark - landmark) / self.half_life)
+        self.table *= factor
+        self._top = {item: weight * factor for item, weight in self._top.items()}
+        self.landmark = landmark
+        self.rescales += 1
+
+    def add_many(self, items, timestamps):
+        items = [item.lower().strip() for item in items]
+        if not items:
+            return
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        newest = int(timestamps.max())
+        if self.landmark is None:
+            self.landmark = newest
+        if self.latest is None or newest > self.latest:
+            self.latest = newest
+        if (self.latest - self.landmark) / self.half_life > self.RESCALE_AT:
+            self._rescale(self.latest)
+        self.n += len(items)
+
+        weights = np.exp2((timestamps - self.landmark) / self.half_life)
+        indices = self._get_indices(items)
+        np.add.at(self._flat, indices.ravel(), np.repeat(weights, self.depth))
+        if self.top_k:
+            self._top.update(zip(items, self._flat[indices].min(axis=1).tolist()))
+            if len(self._top) > 2 * self.top_k:
+                self._top = dict(heapq.nlargest(self.top_k, self._top.items(), key=lambda x: x[1]))
+
+    def add(self, item, timestamp: int):
+        self.add_many([item], [timestamp])
+
+    def _scale(self, now: int = None) -> float:
+        """Factor that turns forward weights into decayed counts as of now (default: newest timestamp)."""
+        if self.landmark is None:
+            return 0.0
+        now = self.latest if now is None else now
+        return 2.0 ** ((self.landmark - now) / self.half_life)
+
+    def estimate_many(self, items, now: int = None) -> np.ndarray:
+        items = [item.lower().strip() for item in items]
+        if not items:
+            return np.zeros(0)
+        return self._flat[self._get_indices(items)].min(axis=1) * self._scale(now)
+
+    def estimate(self, item, now: int = None) -> float:
+        return float(self.estimate_many([item], now)[0])
+
+    def top_k_items(self, n: int = None, now: int = None):
+        """The n (default top_k) items with the highest decayed counts, largest first."""
+        if not self.top_k:
+            raise ValueError("DecayedCountMin was created without top_k")
+        scale = self._scale(now)
+        best = heapq.nlargest(n or self.top_k, self._top.items(), key=lambda x: x[1])
+        return [(item, weight * scale) for item, weight in best]
+
+    def nbytes(self) -> int:
+        """Memory of the weight table plus the top-k candidates (at most 2 * top_k of them)."""
+        total = sys.getsizeof(self.table)
+        if self.top_k:
+            total += (sys.getsizeof(self._top) + sum(map(sys.getsizeof, self._top))
+                      + len(self._top) * FLOAT_BYTES)
+        return total
+
+    def get_stats(self) -> dict:
+        total_mem = self.nbytes()
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "half_life": self.half_life,
+            "memory_kb": total_mem / 1024,
+            "memory_mb": total_mem / (1024 * 1024)
+        }
+
+
+def top_items(estimator, n: int = 10):
+    """Top n (item, count) of any estimator: the CMS candidate heap, or the largest counts."""
+    if hasattr(estimator, "top_k_items"):
+        return estimator.top_k_items(n)
+    return heapq.nlargest(n, estimator.counts.items(), key=lambda x: x[1])
+
+def main():
+    # Registry sketches; CMS needs its top-k mode to report heavy hitters
+    from main import ESTIMATORS
+
+    parser = argparse.ArgumentParser(description="Heavy hitters over recent time on an AOL log sorted by QueryTime.")
+    parser.add_argument("filename", nargs="?", default="clean.txt")
+    parser.add_argument("limit", nargs="?", type=int, default=None, help="Only read the first N lines")
+    parser.add_argument("--sketch", choices=["cmstop", "mg", "lc", "ss"], default="cmstop",
+                        help="Sub-sketch kept per interval")
+    parser.add_argument("--window", type=int, default=3600, help="Window length in seconds")
+    parser.add_argument("--interval", type=int, default=300, help="Seconds covered by one sub-sketch")
+    parser.add_argument("--decay", type=float, default=None, metavar="HALF_LIFE",
+                        help="Also rank by exponentially decayed counts with this half-life in seconds")
+    parser.add_argument("--epsilon", type=float, default=0.0005)
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="Time the ingestion phases and write the profile to PATH as JSON")
+    args = parser.parse_args()
+
+    windowed = SlidingWindow(lambda: ESTIMATORS[args.sketch](args.epsilon), args.window, args.interval)
+    decayed = DecayedCountMin(half_life=args.decay, top_k=100) if args.decay else None
+
+    profiler = Profiler().start() if args.profile else None
+    start = time.perf_counter()
+    for queries, times in iter_timed_queries(args.filename, args.limit, profiler=profiler):
+        if profiler:
+            profiler.batch(len(queries))
+            t0 = time.perf_counter()
+        windowed.add_many(queries, times)
+        if profiler:
+            t1 = time.perf_counter()
+            profiler.add("update:window", t1 - t0)
+        if decayed:
+            decayed.add_many(queries, times)
+            if profiler:
+                profiler.add("update:decayed", time.perf_counter() - t1)
+    elapsed = time.perf_counter() - start
+    if profiler:
+        profiler.count_events({"decayed": decayed} if decayed else {})
+        profiler.save(args.profile)
+        print_profile(profiler.report())
+        print(f"Profile → {args.profile}\n")
+
+    stats = windowed.get_stats()
+    print(f"Processed {windowed.n + windowed.late:,} queries in {elapsed:.2f} seconds "
+          f"({windowed.late:,} already outside the window when read)")
+    print(f"{stats['sub_sketches']} live sub-sketches of {args.interval}s, {stats['memory_kb']:.2f} KB")
+    if windowed.latest is None:
+        return
+    newest = np.datetime64((windowed.latest + 1) * args.interval, "s")
+
+    for seconds in sorted({args.interval, args.window}):
+        print(f"\nTop 10 in the {seconds}s before {newest}")
+        for rank, (query, count) in enumerate(top_items(windowed.summary(seconds)), 1):
+            print(f"{rank:2d}. {to_text(query)[:50]:<50} | {count:8d}")
+    if decayed:
+        print(f"\nTop 10 by decayed count (half-life {args.decay:g}s)")
+        for rank, (query, count) in enumerate(decayed.top_k_items(10), 1):
+            print(f"{rank:2d}. {to_text(query)[:50]:<50} | {count:8.1f}")
+
+
+if __name__ == "__main__":
+    main()